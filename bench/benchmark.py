@@ -0,0 +1,207 @@
+"""
+Benchmark debugging session end to end against fake debugger engine, without Sublime Text.
+
+Drives protocol.ProtocolServer/Protocol, session.SocketHandler actions and view.generate_*
+functions, reporting latency of each step, throughput of responses, render time and peak memory.
+
+Usage:
+    python bench/benchmark.py [--properties N] [--value-size BYTES] [--frames N] [--latency MS] [--steps N] [--renders N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import os
+import socket
+import sys
+import threading
+import time
+
+# Use stand-in for sublime module, and package from repository
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_PATH))
+sys.path.insert(0, BENCH_PATH)
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 3.3 and below
+    tracemalloc = None
+
+import sublime
+
+from fake_engine import FakeEngine
+from xdebug import protocol, session, util, settings as S, view as V
+
+
+def get_free_port():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    port = server.getsockname()[1]
+    server.close()
+    return port
+
+
+def get_peak_memory():
+    """
+    Get peak memory in MB, allocated by Python when available, otherwise peak memory of process.
+    """
+    if tracemalloc is not None:
+        return tracemalloc.get_traced_memory()[1] / 1024.0 / 1024.0
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    except ImportError:
+        return 0.0
+
+
+def measure(function, repeat=1):
+    """
+    Run function and return list with seconds for each run.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.time()
+        function()
+        timings.append(time.time() - started)
+    return timings
+
+
+def report(name, timings):
+    percentiles = util.get_percentiles([timing * 1000 for timing in timings])
+    print('{name:<32} p50 {p50:>9.2f} ms  p90 {p90:>9.2f} ms  max {max:>9.2f} ms'.format(name=name, **percentiles))
+
+
+def connect(options):
+    """
+    Start socket server and fake debugger engine, returns engine once its connection has been accepted.
+    """
+    port = get_free_port()
+    sublime.SETTINGS.update({
+        'port': port,
+        'super_globals': True,
+        'max_children': 32,
+        'max_data': options.value_size,
+        'max_depth': 1,
+        'break_on_start': False
+    })
+    S.CONFIG = None
+    S.CONFIG_PACKAGE = None
+    S.CONFIG_PROJECT = None
+
+    accepted = threading.Event()
+
+    def accept(connection):
+        S.SESSION = connection
+        accepted.set()
+
+    S.SESSION_SERVER = protocol.ProtocolServer()
+    listener = threading.Thread(target=S.SESSION_SERVER.listen, args=(accept,))
+    listener.daemon = True
+    listener.start()
+
+    engine = FakeEngine(port, properties=options.properties, value_size=options.value_size,
+                        frames=options.frames, latency=options.latency / 1000.0)
+    engine.start()
+    if not accepted.wait(10):
+        raise RuntimeError('Fake debugger engine did not connect.')
+    return engine
+
+
+class BenchmarkHandler(session.SocketHandler):
+    """
+    Socket handler which signals once its action has been run by session worker,
+    while actions it started itself, like prefetching context of stack frames, keep running.
+    """
+    def __init__(self, action, **options):
+        session.SocketHandler.__init__(self, action, **options)
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            session.SocketHandler.run(self)
+        finally:
+            self.done.set()
+
+
+def run_action(action, **options):
+    """
+    Run action of socket handler in session worker, after previously requested actions,
+    and wait until it has been run.
+    """
+    handler = BenchmarkHandler(action, **options)
+    handler.start()
+    if not handler.done.wait(60):
+        raise RuntimeError('Action %s did not finish.' % action)
+
+
+def wait_idle():
+    """
+    Wait until session worker has run all requested actions.
+    """
+    # Action which is not a refresh, so it is never dropped from queue
+    run_action(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark debugging session against fake debugger engine.')
+    parser.add_argument('--properties', type=int, default=200, help='properties per context_get response')
+    parser.add_argument('--value-size', type=int, default=256, help='bytes per property value')
+    parser.add_argument('--frames', type=int, default=20, help='frames per stack_get response')
+    parser.add_argument('--latency', type=float, default=1.0, help='milliseconds before engine responds')
+    parser.add_argument('--steps', type=int, default=20, help='amount of step_into commands')
+    parser.add_argument('--renders', type=int, default=20, help='amount of renders per output')
+    options = parser.parse_args()
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+
+    print('properties={0.properties} value_size={0.value_size} frames={0.frames} latency={0.latency}ms steps={0.steps}'.format(options))
+    engine = connect(options)
+
+    # Session initialization: features and breakpoints
+    S.BREAKPOINT = {'/var/www/index.php': dict((str(lineno), {'enabled': True, 'expression': None, 'id': None}) for lineno in range(1, 21))}
+    report('init', measure(lambda: run_action(session.ACTION_INIT)))
+
+    # Step until break, retrieving context, stack and watch values
+    report('step (execute + refresh)', measure(lambda: run_action(session.ACTION_EXECUTE, command='step_into'), options.steps))
+
+    # Select stack frames, first retrieving their context, then from cache
+    depths = list(range(1, min(options.frames, 6)))
+    report('select frame (retrieve)', measure(lambda: run_action(session.ACTION_FRAME, depth=depths.pop(0)), len(depths)))
+    wait_idle()
+    report('select frame (cached)', measure(lambda: [run_action(session.ACTION_FRAME, depth=depth) for depth in (1, 0)]))
+
+    # Render output of context and stack
+    wait_idle()
+    context = S.CONTEXT_FRAMES.get(0, S.CONTEXT_DATA)
+    report('generate_context_output', measure(lambda: V.generate_context_output(context), options.renders))
+    max_length, max_children = 64, 20
+    report('generate_context_output limited', measure(lambda: V.generate_context_output(context, max_length=max_length, max_children=max_children), options.renders))
+    stack = S.SESSION.request('stack_get').result()
+    report('generate_stack_output', measure(lambda: V.generate_stack_output(stack), options.renders))
+
+    # Throughput of context responses, from statistics of protocol
+    statistics = [item for item in S.COMMAND_STATISTICS if item['command'] == 'context_get' and item['rtt']]
+    received = sum(item['bytes_received'] for item in statistics)
+    elapsed = sum(item['rtt'] for item in statistics)
+    if elapsed:
+        print('{name:<32} {mb:.2f} MB in {count} responses, {rate:.1f} MB/s'.format(name='context_get throughput',
+              mb=received / 1024.0 / 1024.0, count=len(statistics), rate=received / 1024.0 / 1024.0 / elapsed))
+    print('{name:<32} {commands} commands, {timeouts} main thread callbacks'.format(name='traffic',
+          commands=len(engine.commands), timeouts=len(sublime.timeouts)))
+
+    gc.collect()
+    print('{name:<32} {peak:.1f} MB'.format(name='peak memory', peak=get_peak_memory()))
+    print('')
+    print(V.generate_statistics_output(util.get_command_statistics()))
+
+    # Disconnect from fake debugger engine
+    S.SESSION_SERVER.clear()
+    S.SESSION.clear()
+    engine.join(1)
+
+
+if __name__ == '__main__':
+    main()
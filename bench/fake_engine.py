@@ -0,0 +1,205 @@
+"""
+Fake DBGp debugger engine, which connects to the IDE and replays scripted responses,
+with configurable payload size and latency, instead of running PHP with Xdebug.
+"""
+
+import base64
+import socket
+import threading
+import time
+
+try:
+    import queue
+except:
+    import Queue as queue
+
+RESPONSE_HEADER = '<?xml version="1.0" encoding="iso-8859-1"?>\n'
+RESPONSE_NAMESPACE = 'xmlns="urn:debugger_protocol_v1" xmlns:xdebug="http://xdebug.org/dbgp/xdebug"'
+
+FILEURI = 'file:///var/www/index.php'
+
+
+def encode(value):
+    return base64.b64encode(value.encode('utf8')).decode('ascii')
+
+
+def frame(xml):
+    """
+    Frame response data according to DBGp protocol, length of data and data separated by NULL bytes.
+    """
+    data = (RESPONSE_HEADER + xml).encode('iso-8859-1', 'xmlcharrefreplace')
+    return str(len(data)).encode('ascii') + b'\x00' + data + b'\x00'
+
+
+def parse_command(command):
+    """
+    Split command into name and dictionary with arguments, expression after '--' is stored as 'data'.
+    """
+    if ' -- ' in command:
+        command, data = command.split(' -- ', 1)
+    else:
+        data = None
+    parts = command.split(' ')
+    arguments = {'data': data}
+    index = 1
+    while index < len(parts):
+        if parts[index].startswith('-') and index + 1 < len(parts):
+            arguments[parts[index][1:]] = parts[index + 1]
+            index += 2
+        else:
+            index += 1
+    return parts[0], arguments
+
+
+class FakeEngine(threading.Thread):
+    """
+    Debugger engine which connects to IDE and replays scripted responses for each command.
+
+    Keyword arguments:
+    port -- Port number on which IDE listens for debugger engine.
+    properties -- Amount of properties in response of context_get.
+    value_size -- Size in bytes of value of each property.
+    frames -- Amount of frames in response of stack_get.
+    latency -- Seconds before response is sent, after command has been received.
+    idekey -- IDE key to send in init packet.
+    """
+    def __init__(self, port, properties=50, value_size=64, frames=10, latency=0.0, idekey='sublime.xdebug'):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.port = port
+        self.properties = properties
+        self.value_size = value_size
+        self.frames = frames
+        self.latency = latency
+        self.idekey = idekey
+        self.commands = []
+        self.lineno = 1
+        self.breakpoint_id = 0
+        self.responses = queue.Queue()
+        self.socket = None
+
+    def run(self):
+        self.socket = self.connect()
+        writer = threading.Thread(target=self.write)
+        writer.daemon = True
+        writer.start()
+        self.send(0, '<init %s fileuri="%s" language="PHP" protocol_version="1.0" appid="%d" idekey="%s"/>'
+                     % (RESPONSE_NAMESPACE, FILEURI, id(self), self.idekey))
+        buffer = b''
+        try:
+            while True:
+                data = self.socket.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                while b'\x00' in buffer:
+                    command, buffer = buffer.split(b'\x00', 1)
+                    received = time.time()
+                    command = command.decode('utf8')
+                    self.commands.append(command)
+                    name, arguments = parse_command(command)
+                    self.send(received + self.latency, self.respond(name, arguments))
+                    if name in ('stop', 'detach'):
+                        return
+        except socket.error:
+            pass
+        finally:
+            self.responses.put(None)
+
+    def connect(self, timeout=5):
+        """
+        Connect with IDE, retrying until it listens for debugger engine.
+        """
+        started = time.time()
+        while True:
+            try:
+                connection = socket.create_connection(('127.0.0.1', self.port))
+            except socket.error:
+                if time.time() - started > timeout:
+                    raise
+                time.sleep(0.05)
+                continue
+            # Send small responses immediately like Xdebug does, instead of waiting for acknowledgement of previous ones
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return connection
+
+    def send(self, due, xml):
+        self.responses.put((due, frame(xml)))
+
+    def write(self):
+        # Send responses in order, each one once its latency has passed
+        while True:
+            response = self.responses.get()
+            if response is None:
+                break
+            due, data = response
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.socket.sendall(data)
+            except socket.error:
+                break
+
+    def respond(self, name, arguments):
+        """
+        Generate response data for command.
+
+        Keyword arguments:
+        name -- Name of command.
+        arguments -- Dictionary with arguments of command.
+        """
+        transaction_id = arguments.get('i')
+        attributes = '%s command="%s" transaction_id="%s"' % (RESPONSE_NAMESPACE, name, transaction_id)
+        if name in ('feature_set', 'breakpoint_remove'):
+            return '<response %s feature="%s" success="1"/>' % (attributes, arguments.get('n', ''))
+        if name == 'breakpoint_set':
+            self.breakpoint_id += 1
+            return '<response %s state="enabled" id="%d"/>' % (attributes, self.breakpoint_id)
+        if name == 'breakpoint_list':
+            return '<response %s/>' % attributes
+        if name == 'status':
+            return '<response %s status="break" reason="ok"/>' % attributes
+        if name in ('run', 'step_into', 'step_over', 'step_out'):
+            self.lineno += 1
+            return '<response %s status="break" reason="ok"><xdebug:message filename="%s" lineno="%d"/></response>' \
+                   % (attributes, FILEURI, self.lineno)
+        if name in ('stop', 'detach'):
+            return '<response %s status="stopping" reason="ok"/>' % attributes
+        if name == 'stack_get':
+            stack = ''.join('<stack where="function_%d" level="%d" type="file" filename="%s" lineno="%d"/>'
+                            % (level, level, FILEURI, self.lineno + level) for level in range(self.frames))
+            return '<response %s>%s</response>' % (attributes, stack)
+        if name == 'context_get':
+            depth = int(arguments.get('d', 0))
+            context = int(arguments.get('c', 0))
+            return '<response %s context="%d">%s</response>' % (attributes, context, self.generate_properties(depth, context))
+        if name in ('eval', 'property_get'):
+            return '<response %s>%s</response>' % (attributes, self.generate_property('$value', '$value', 0))
+        if name == 'property_value':
+            return '<response %s size="%d" encoding="base64"><![CDATA[%s]]></response>' \
+                   % (attributes, self.value_size, encode(self.generate_value(0)))
+        return '<response %s><error code="4"><message><![CDATA[unimplemented command]]></message></error></response>' % attributes
+
+    def generate_value(self, index):
+        return ('value %d ' % index + 'x' * self.value_size)[:self.value_size]
+
+    def generate_property(self, name, fullname, index):
+        return '<property name="%s" fullname="%s" type="string" size="%d" encoding="base64"><![CDATA[%s]]></property>' \
+               % (name, fullname, self.value_size, encode(self.generate_value(index)))
+
+    def generate_properties(self, depth, context):
+        """
+        Generate properties of context, every fourth property being an array with children.
+        """
+        prefix = '$_SERVER' if context == 1 else '$frame%d_' % depth
+        properties = []
+        for index in range(self.properties):
+            name = '%s%d' % (prefix, index)
+            if index % 4 == 3:
+                children = ''.join(self.generate_property(str(child), "%s[%d]" % (name, child), child) for child in range(3))
+                properties.append('<property name="%s" fullname="%s" type="array" children="1" numchildren="3" page="0" pagesize="32">%s</property>'
+                                  % (name, name, children))
+            else:
+                properties.append(self.generate_property(name, name, index))
+        return ''.join(properties)
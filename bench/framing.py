@@ -0,0 +1,145 @@
+"""
+Benchmark reading DBGp frames, without network or debugger engine.
+
+Replays recorded frames through a fake socket, which returns data in fixed-size chunks,
+and times protocol.Protocol read_until_null, read_data and read_iter for several read sizes.
+
+Usage:
+    python bench/framing.py [--capture FILE] [--chunk BYTES] [--read-sizes N,N,...] [--rounds N]
+
+Capture file holds data as sent by debugger engine, frames of 'length NULL xml NULL',
+for example recorded with socat or tcpdump. Without capture file, frames are recorded
+from responses of fake debugger engine.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+# Use stand-in for sublime module, and package from repository
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_PATH))
+sys.path.insert(0, BENCH_PATH)
+
+from fake_engine import FakeEngine, frame
+from xdebug import protocol, util
+
+
+class ReplaySocket(object):
+    """
+    Socket which returns recorded data in chunks of fixed size, like data arriving from network.
+
+    Keyword arguments:
+    data -- Recorded data to return.
+    chunk -- Maximum amount of bytes to return by each call.
+    """
+    def __init__(self, data, chunk):
+        self.data = data
+        self.chunk = chunk
+        self.offset = 0
+
+    def recv_into(self, buffer, nbytes=0):
+        size = min(nbytes or len(buffer), self.chunk, len(self.data) - self.offset)
+        buffer[:size] = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+    def recv(self, bufsize):
+        size = min(bufsize, self.chunk, len(self.data) - self.offset)
+        self.offset += size
+        return self.data[self.offset - size:self.offset]
+
+    def settimeout(self, timeout):
+        pass
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        pass
+
+
+def record_frames(properties, value_size, frames):
+    """
+    Record frames of a break: step_into, stack_get and context_get of locals and super globals.
+    """
+    engine = FakeEngine(0, properties=properties, value_size=value_size, frames=frames)
+    commands = [
+        ('step_into', {'i': '1'}),
+        ('stack_get', {'i': '2'}),
+        ('context_get', {'i': '3', 'd': '0', 'c': '1'}),
+        ('context_get', {'i': '4', 'd': '0', 'c': '0'})
+    ]
+    return b''.join(frame(engine.respond(name, arguments)) for name, arguments in commands)
+
+
+def count_frames(data):
+    """
+    Count frames in recorded data, by their NULL separators.
+    """
+    return data.count(b'\x00') // 2
+
+
+def read_until_null(session):
+    session.read_length()
+    session.read_until_null()
+
+
+def read_data(session):
+    session.read_data()
+
+
+def read_iter(session):
+    for _ in session.read_iter():
+        pass
+
+
+def measure(function, data, chunk, read_size, rounds):
+    """
+    Read all frames of data with function, returns list with seconds for each round.
+    """
+    frames = count_frames(data)
+    timings = []
+    for _ in range(rounds):
+        session = protocol.Protocol(ReplaySocket(data, chunk))
+        session.read_size = read_size
+        started = time.time()
+        for _ in range(frames):
+            function(session)
+        timings.append(time.time() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reading DBGp frames from fake socket.')
+    parser.add_argument('--capture', help='file with data as sent by debugger engine, instead of recorded frames')
+    parser.add_argument('--chunk', type=int, default=1460, help='maximum bytes returned by each receive of socket')
+    parser.add_argument('--read-sizes', default='1024,4096,8192,65536', help='comma separated read sizes of protocol')
+    parser.add_argument('--rounds', type=int, default=20, help='amount of times all frames are read')
+    parser.add_argument('--properties', type=int, default=200, help='properties per context_get response')
+    parser.add_argument('--value-size', type=int, default=256, help='bytes per property value')
+    parser.add_argument('--frames', type=int, default=20, help='frames per stack_get response')
+    options = parser.parse_args()
+
+    if options.capture:
+        with open(options.capture, 'rb') as capture:
+            data = capture.read()
+    else:
+        data = record_frames(options.properties, options.value_size, options.frames)
+    megabytes = len(data) / 1024.0 / 1024.0
+    print('{frames} frames, {size} bytes, chunk={chunk} rounds={rounds}'.format(frames=count_frames(data), size=len(data),
+          chunk=options.chunk, rounds=options.rounds))
+
+    for name, function in (('read_until_null', read_until_null), ('read_data', read_data), ('read_iter', read_iter)):
+        for read_size in [int(size) for size in options.read_sizes.split(',')]:
+            timings = measure(function, data, options.chunk, read_size, options.rounds)
+            percentiles = util.get_percentiles([timing * 1000 for timing in timings])
+            print('{name:<16} read_size {read_size:>6}  p50 {p50:>8.2f} ms  p90 {p90:>8.2f} ms  {rate:>8.1f} MB/s'.format(
+                  name=name, read_size=read_size, rate=megabytes / max(percentiles['p50'] / 1000.0, 1e-9), **percentiles))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Stand-in for the sublime module of Sublime Text, to run package modules without Sublime Text.
+Only provides what is used by protocol, session and output generation of debugging session.
+Functions passed to set_timeout are queued instead of being run, see run_timeouts().
+"""
+
+import os
+import tempfile
+import threading
+
+DRAW_OUTLINED = 256
+HIDDEN = 128
+
+# Package settings, as would be loaded from Xdebug.sublime-settings
+SETTINGS = {}
+
+# Packages folder, with User folder for data files of package
+PACKAGES_PATH = tempfile.mkdtemp(prefix='xdebug-bench-')
+os.mkdir(os.path.join(PACKAGES_PATH, 'User'))
+
+# Functions which would be run in main thread of Sublime Text
+timeouts = []
+timeouts_lock = threading.Lock()
+
+
+class Region(object):
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def size(self):
+        return abs(self.b - self.a)
+
+
+class Settings(object):
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key, default_value=None):
+        return self.values.get(key, default_value)
+
+    def has(self, key):
+        return key in self.values
+
+    def set(self, key, value):
+        self.values[key] = value
+
+    def erase(self, key):
+        self.values.pop(key, None)
+
+
+class View(object):
+    def __init__(self, name=''):
+        self._name = name
+        self._settings = Settings({})
+
+    def file_name(self):
+        return None
+
+    def name(self):
+        return self._name
+
+    def run_command(self, command, args=None):
+        pass
+
+    def settings(self):
+        return self._settings
+
+
+class Window(object):
+    def __init__(self):
+        self.view = View()
+        self._settings = Settings({})
+
+    def active_group(self):
+        return 0
+
+    def active_view(self):
+        return self.view
+
+    def active_view_in_group(self, group):
+        return self.view
+
+    def find_open_file(self, filename):
+        return None
+
+    def focus_group(self, group):
+        pass
+
+    def focus_view(self, view):
+        pass
+
+    def get_layout(self):
+        return {'cols': [0.0, 1.0], 'rows': [0.0, 1.0], 'cells': [[0, 0, 1, 1]]}
+
+    def get_output_panel(self, name):
+        return View(name)
+
+    def num_groups(self):
+        return 1
+
+    def project_file_name(self):
+        return None
+
+    def run_command(self, command, args=None):
+        pass
+
+    def settings(self):
+        return self._settings
+
+    def views(self):
+        return []
+
+    def views_in_group(self, group):
+        return []
+
+
+window = Window()
+
+
+def active_window():
+    return window
+
+
+def error_message(message):
+    pass
+
+
+def load_settings(name):
+    return Settings(SETTINGS)
+
+
+def packages_path():
+    return PACKAGES_PATH
+
+
+def run_timeouts():
+    """
+    Run queued functions, like Sublime Text would in its main thread.
+    Returns amount of functions which have been run.
+    """
+    with timeouts_lock:
+        queued = timeouts[:]
+        del timeouts[:]
+    for function in queued:
+        function()
+    return len(queued)
+
+
+def score_selector(scope, selector):
+    return 0
+
+
+def set_timeout(function, delay):
+    with timeouts_lock:
+        timeouts.append(function)
+
+
+def status_message(message):
+    pass
+
+
+def version():
+    return '3000'
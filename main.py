@@ -43,8 +43,15 @@ class EventListener(sublime_plugin.EventListener):
         sublime.set_timeout(lambda: V.render_regions(view), 0)
 
     def on_activated(self, view):
+        # Update config when switching to view of another project
+        config.load_project_values()
         # Render breakpoint markers
         V.render_regions(view)
+        # Evaluate watch expressions which have been skipped while Watch view was not visible
+        if view.name() == V.TITLE_WINDOW_WATCH and S.BREAKPOINT_ROW is not None and session.is_connected() and not S.SESSION_BUSY:
+            if [item for item in S.WATCH if item['enabled'] and item['value'] is None]:
+                async_session = session.SocketHandler(session.ACTION_WATCH, check_watch_view=True)
+                async_session.start()
 
     def on_post_save(self, view):
         filename = view.file_name()
@@ -255,6 +262,7 @@ class XdebugSessionStartCommand(sublime_plugin.WindowCommand):
         S.BREAKPOINT_EXCEPTION = None
         S.BREAKPOINT_ROW = None
         S.CONTEXT_DATA.clear()
+        util.clear_property_cache()
         async_session = session.SocketHandler(session.ACTION_WATCH, check_watch_view=True)
         async_session.start()
         # Remove temporary breakpoint
@@ -267,21 +275,21 @@ class XdebugSessionStartCommand(sublime_plugin.WindowCommand):
         if launch_browser or (config.get_value(S.KEY_LAUNCH_BROWSER) and not restart):
             util.launch_browser()
 
-        # Start thread which will run method that listens for response on configured port
-        threading.Thread(target=self.listen).start()
-
-    def listen(self):
-        # Start listening for response from debugger engine
-        S.SESSION.listen()
-        # On connect run method which handles connection
-        if S.SESSION and S.SESSION.connected:
-            sublime.set_timeout(self.connected, 0)
-
-    def connected(self):
-        sublime.set_timeout(lambda: sublime.status_message('Xdebug: Connected'), 100)
+        # Start thread which will run method that listens for connections on configured port
+        if S.SESSION_SERVER is None:
+            S.SESSION_SERVER = protocol.ProtocolServer()
+            threading.Thread(target=self.listen, args=(S.SESSION_SERVER,)).start()
+        # Debug session which has connected while previous session was being debugged
+        else:
+            session.adopt_session()
 
-        async_session = session.SocketHandler(session.ACTION_INIT)
-        async_session.start()
+    def listen(self, server):
+        # Keep listening for connections from debugger engine, until session is stopped
+        try:
+            server.listen(session.accept_session)
+        except protocol.ProtocolConnectionException:
+            e = sys.exc_info()[1]
+            sublime.set_timeout(lambda: session.connection_error("%s" % e), 0)
 
     def is_enabled(self):
         if S.SESSION:
@@ -324,10 +332,15 @@ class XdebugSessionStopCommand(sublime_plugin.WindowCommand):
             pass
         finally:
             S.SESSION = None
+            # Keep listening for connections when restarting session
+            if not restart and S.SESSION_SERVER is not None:
+                S.SESSION_SERVER.clear()
+                S.SESSION_SERVER = None
             S.SESSION_BUSY = False
             S.BREAKPOINT_EXCEPTION = None
             S.BREAKPOINT_ROW = None
             S.CONTEXT_DATA.clear()
+            util.clear_property_cache()
             async_session = session.SocketHandler(session.ACTION_WATCH, check_watch_view=True)
             async_session.start()
             # Remove temporary breakpoint
@@ -403,7 +416,7 @@ class XdebugContinueCommand(sublime_plugin.WindowCommand):
             self.callback(command)
 
     def callback(self, command):
-        if command == -1 or S.SESSION_BUSY:
+        if command == -1:
             return
         if isinstance(command, int):
             command = self.command_index[command]
@@ -453,6 +466,67 @@ class XdebugEvaluateCommand(sublime_plugin.WindowCommand):
         return session.is_connected()
 
 
+class XdebugExpandCommand(sublime_plugin.WindowCommand):
+    """
+    Retrieve children of context variable, which have not been retrieved with context variables.
+
+    Keyword arguments:
+    name -- Full name of variable in context data.
+    """
+    def run(self, name=None):
+        async_session = session.SocketHandler(session.ACTION_EXPAND, name=name)
+        async_session.start()
+
+    def is_enabled(self):
+        return session.is_connected()
+
+
+class XdebugExpandValueCommand(sublime_plugin.WindowCommand):
+    """
+    Retrieve complete value of context variable, which has been truncated by maximum amount of data.
+
+    Keyword arguments:
+    name -- Full name of variable in context data.
+    """
+    def run(self, name=None):
+        async_session = session.SocketHandler(session.ACTION_EXPAND_VALUE, name=name)
+        async_session.start()
+
+    def is_enabled(self):
+        return session.is_connected()
+
+
+class XdebugFrameCommand(sublime_plugin.WindowCommand):
+    """
+    Show variables of stack frame in context view.
+
+    Keyword arguments:
+    depth -- Stack depth of frame.
+    """
+    def run(self, depth=0):
+        async_session = session.SocketHandler(session.ACTION_FRAME, depth=depth)
+        async_session.start()
+
+    def is_enabled(self):
+        return session.is_connected()
+
+
+class XdebugStatsCommand(sublime_plugin.WindowCommand):
+    """
+    Show statistics of recent commands sent to debugger engine in output panel, and export them as JSON.
+    """
+    def run(self):
+        summary = util.get_command_statistics()
+        output = V.generate_statistics_output(summary)
+        try:
+            output += H.unicode_string('\nExported to %s\n' % util.save_statistics_data())
+        except:
+            e = sys.exc_info()[1]
+            log.info('Failed to export statistics.')
+            log.debug(e)
+        V.show_panel_content(output)
+
+
 class XdebugUserExecuteCommand(sublime_plugin.WindowCommand):
     """
     Open input panel, allowing user to execute arbitrary command according to DBGp protocol.
@@ -581,13 +655,20 @@ class XdebugViewUpdateCommand(sublime_plugin.TextCommand):
     Keyword arguments:
     data -- Content data to populate sublime.Edit object with.
     readonly -- Make sublime.Edit object read only.
+    diff -- Only update lines which have been changed compared to previous content.
+    fold -- Fold indentation blocks of changed lines, when only updating changed lines.
     """
-    def run(self, edit, data=None, readonly=False):
+    def run(self, edit, data=None, readonly=False, diff=False, fold=False):
         view = self.view
         view.set_read_only(False)
-        view.erase(edit, sublime.Region(0, view.size()))
-        if data is not None:
-            view.insert(edit, 0, data)
+        if diff and data is not None:
+            V.update_view_content(view, edit, data, fold)
+        else:
+            if view.id() in S.VIEW_HASHES:
+                del S.VIEW_HASHES[view.id()]
+            view.erase(edit, sublime.Region(0, view.size()))
+            if data is not None:
+                view.insert(edit, 0, data)
         if readonly:
             view.set_read_only(True)
 
@@ -1,5 +1,7 @@
 import sublime
 
+from collections import namedtuple
+
 # Settings variables
 try:
     from . import settings as S
@@ -7,11 +9,23 @@ except:
     import settings as S
 
 
+# Immutable snapshot with value of each configuration key
+ConfigSnapshot = namedtuple('ConfigSnapshot', S.CONFIG_KEYS)
+
+
 def load_project_values():
     try:
         settings = sublime.active_window().active_view().settings()
         # Use 'xdebug' as key which contains dictionary with project values for package
-        S.CONFIG_PROJECT = settings.get(S.KEY_XDEBUG)
+        config = settings.get(S.KEY_XDEBUG)
+        # Rebuild configuration snapshot and path mapping when project values have been changed
+        if config != S.CONFIG_PROJECT:
+            S.CONFIG = None
+            S.PATH_MAPPING = None
+        S.CONFIG_PROJECT = config
+    except RuntimeError:
+        # Sublime Text 2 API is not available in thread
+        raise
     except:
         pass
 
@@ -27,22 +41,54 @@ def load_package_values():
             # Set in config if available
             if settings and settings.has(key):
                 config[key] = settings.get(key)
+    except RuntimeError:
+        # Sublime Text 2 API is not available in thread
+        raise
     except:
         pass
+    # Rebuild configuration snapshot and path mapping when package values have been changed
+    if config != S.CONFIG_PACKAGE:
+        S.CONFIG = None
+        S.PATH_MAPPING = None
     # Set settings in memory
     S.CONFIG_PACKAGE = config
 
 
+def load_config_snapshot():
+    """
+    Build snapshot of package/project configuration values, as loaded in memory.
+    Project values take precedence over package values.
+    """
+    values = []
+    for key in S.CONFIG_KEYS:
+        value = None
+        if isinstance(S.CONFIG_PROJECT, dict):
+            value = S.CONFIG_PROJECT.get(key)
+        if value is None and isinstance(S.CONFIG_PACKAGE, dict):
+            value = S.CONFIG_PACKAGE.get(key)
+        values.append(value)
+    S.CONFIG = ConfigSnapshot(*values)
+    return S.CONFIG
+
+
 def get_value(key, default_value=None):
     """
     Get value from package/project configuration settings.
     """
-    # Get value from project configuration
-    value = get_project_value(key)
-    # Use package configuration when value has not been found
-    if value is None:
-        value = get_package_value(key)
+    # Use snapshot of configuration, which is reset when package/project values have been changed
+    config = S.CONFIG
+    if config is None:
+        # Load package/project values when requested before package has been initialized
+        if S.CONFIG_PACKAGE is None:
+            try:
+                load_package_values()
+                load_project_values()
+            except RuntimeError:
+                sublime.set_timeout(lambda: load_package_values(), 0)
+                sublime.set_timeout(lambda: load_project_values(), 0)
+        config = load_config_snapshot()
     # Return package/project value
+    value = getattr(config, key, None)
     if value is not None:
         return value
     # Otherwise use default value
@@ -78,6 +78,7 @@ ATTRIBUTE_STATUS = 'status'
 ATTRIBUTE_REASON = 'reason'
 ATTRIBUTE_SUCCESS = 'success'
 ATTRIBUTE_BREAKPOINT_ID = 'id'
+ATTRIBUTE_TRANSACTION_ID = 'transaction_id'
 ELEMENT_INIT = 'init'
 ELEMENT_BREAKPOINT = 'xdebug:message'
 ELEMENT_ERROR = 'error'
@@ -117,6 +118,8 @@ BREAKPOINT_HIT_COUNT = 'hit_count'
 BREAKPOINT_HIT_VALUE = 'hit_value'
 BREAKPOINT_HIT_CONDITION = 'hit_condition'
 BREAKPOINT_EXCEPTION = 'exception'
+BREAKPOINT_TYPE_LINE = 'line'
+BREAKPOINT_TYPE_EXCEPTION = 'exception'
 BREAKPOINT_EXPRESSION = 'expression'
 
 
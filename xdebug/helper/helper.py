@@ -7,6 +7,8 @@ Helper module for Python version 3.0 and above
 """
 
 import base64
+import codecs
+import sys
 import urllib.parse
 from collections import OrderedDict
 
@@ -32,6 +34,13 @@ def data_read(data):
 	# Convert bytes to string
 	return data.decode('utf8')
 
+def new_data_decoder():
+	# Incremental decoder, keeps incomplete multibyte characters for next chunk of bytes
+	decoder = codecs.getincrementaldecoder('utf8')()
+	def decode(data, final=False):
+		return decoder.decode(bytes(data), final)
+	return decode
+
 def data_write(data):
 	# Convert string to bytes
 	return bytes(data, 'utf8')
@@ -40,6 +49,15 @@ def base64_decode(data):
 	# Base64 returns decoded byte string, decode to convert to UTF8 string
 	return base64.b64decode(data).decode('utf8')
 
+def base64_decode_prefix(data, length):
+	# Decode only enough Base64 characters for length of UTF8 characters, each using up to 4 bytes
+	size = (length * 4 + 2) // 3 * 4
+	if len(data) <= size:
+		return base64_decode(data)[:length]
+	# Incremental decoder leaves out incomplete multibyte character at the end
+	decoder = codecs.getincrementaldecoder('utf8')()
+	return decoder.decode(base64.b64decode(data[:size]))[:length]
+
 def base64_encode(data):
 	# Base64 needs ascii input to encode, which returns Base64 byte string, decode to convert to UTF8 string
 	return base64.b64encode(data.encode('ascii')).decode('utf8')
@@ -51,6 +69,12 @@ def unicode_string(string):
 	# Python 3.* uses unicode by default
 	return string
 
+def intern_string(string):
+	# Share equal strings in memory
+	if isinstance(string, str):
+		return sys.intern(string)
+	return string
+
 def is_digit(string):
 	# Check if string is digit
 	return isinstance(string, str) and string.isdigit()
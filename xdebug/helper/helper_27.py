@@ -30,8 +30,17 @@ def dictionary_values(dictionary):
 
 def data_read(data):
 	# Data for reading/receiving already a string in version 2.*
+	# Convert buffer (bytearray) to string
+	if isinstance(data, bytearray):
+		return str(data)
 	return data
 
+def new_data_decoder():
+	# Data for reading/receiving is not decoded in version 2.*
+	def decode(data, final=False):
+		return data_read(data)
+	return decode
+
 def data_write(data):
 	# Using string in version 2.* for sending/writing data
 	return data
@@ -39,6 +48,12 @@ def data_write(data):
 def base64_decode(data):
 	return base64.b64decode(data)
 
+def base64_decode_prefix(data, length):
+	# Decode only enough Base64 characters for length of UTF8 characters, each using up to 4 bytes
+	size = (length * 4 + 2) // 3 * 4
+	# Incomplete multibyte character at the end can only be replaced after length of characters
+	return base64.b64decode(data[:size]).decode('utf8', 'replace')[:length]
+
 def base64_encode(data):
 	return base64.b64encode(data)
 
@@ -50,6 +65,12 @@ def unicode_string(string):
 		return string
 	return string.decode('utf8', 'replace')
 
+def intern_string(string):
+	# Only byte strings can be interned
+	if isinstance(string, str):
+		return intern(string)
+	return string
+
 def is_digit(string):
 	# Check if basestring (str, unicode) is digit
 	return isinstance(string, basestring) and string.isdigit()
@@ -1,7 +1,14 @@
 import sublime
 
 import logging
+import logging.handlers
 import os
+import threading
+
+try:
+    import queue
+except:
+    import Queue as queue
 
 # Settings variables
 try:
@@ -13,21 +20,84 @@ except:
 from .config import get_value
 
 
+# Rotate output file when it exceeds size, keeping one previous output file
+MAX_FILE_SIZE = 5 * 1024 * 1024
+MAX_FILE_BACKUP = 1
+# Truncate messages which exceed size, like large response data
+MAX_MESSAGE_SIZE = 64 * 1024
+
+# Logger for package, instead of root logger which is shared with other packages
+logger = logging.getLogger('Xdebug')
+logger.propagate = False
+
+
+class QueueHandler(logging.Handler):
+    """
+    Handler which puts log records in a queue, which are formatted and written
+    by a background thread, instead of blocking thread which logs the message.
+    """
+    def __init__(self, handler):
+        logging.Handler.__init__(self)
+        self.handler = handler
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.write)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def emit(self, record):
+        self.queue.put(record)
+
+    def close(self):
+        # Stop background thread after remaining records have been written
+        self.queue.put(None)
+        if self.thread is not threading.current_thread():
+            self.thread.join(1)
+        logging.Handler.close(self)
+
+    def write(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            try:
+                # Format message, truncate when exceeding maximum size
+                message = record.getMessage()
+                if len(message) > MAX_MESSAGE_SIZE:
+                    message = message[:MAX_MESSAGE_SIZE] + '... (%d characters truncated)' % (len(message) - MAX_MESSAGE_SIZE)
+                record.msg = message
+                record.args = None
+                self.handler.handle(record)
+            except:
+                pass
+        self.handler.close()
+
+
 def clear_output():
+    # Stop writing to previous output file
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+        handler.close()
     # Clear previous output file and configure logging module
     output_file = os.path.join(sublime.packages_path(), 'User', S.FILE_LOG_OUTPUT)
-    logging.basicConfig(filename=output_file, filemode='w', level=logging.DEBUG, format='[%(asctime)s] %(levelname)s - %(message)s', datefmt='%m/%d/%Y %I:%M:%S%p')
+    try:
+        open(output_file, 'w').close()
+    except:
+        pass
+    file_handler = logging.handlers.RotatingFileHandler(output_file, maxBytes=MAX_FILE_SIZE, backupCount=MAX_FILE_BACKUP)
+    file_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s - %(message)s', '%m/%d/%Y %I:%M:%S%p'))
+    logger.addHandler(QueueHandler(file_handler))
+    logger.setLevel(logging.DEBUG)
 
 
-def debug(message=None):
+def debug(message=None, *args):
     if not get_value(S.KEY_DEBUG) or message is None:
         return
-    # Write message to output file
-    logging.debug(message)
+    # Write message to output file, arguments are formatted when message is written
+    logger.debug(message, *args)
 
 
-def info(message=None):
+def info(message=None, *args):
     if message is None:
         return
-    # Write message to output file
-    logging.info(message)
\ No newline at end of file
+    # Write message to output file, arguments are formatted when message is written
+    logger.info(message, *args)
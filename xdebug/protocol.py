@@ -1,6 +1,7 @@
 import re
 import socket
 import sys
+import time
 
 # Helper module
 try:
@@ -14,6 +15,12 @@ try:
 except:
     import settings as S
 
+# DBGp protocol constants
+try:
+    from . import dbgp
+except:
+    import dbgp
+
 # Config module
 from .config import get_value
 
@@ -43,6 +50,17 @@ except ImportError:
     ET.XMLTreeBuilder = SimpleXMLTreeBuilder.TreeBuilder
     UNESCAPE_RESPONSE_DATA = False
 
+# Parse response data incrementally while it is being received
+STREAM_RESPONSE_DATA = UNESCAPE_RESPONSE_DATA and hasattr(ET, 'XMLParser') and hasattr(ET, 'TreeBuilder')
+
+# Receive data directly into (part of) buffer
+try:
+    memoryview
+    RECEIVE_INTO_VIEW = True
+except NameError:
+    # Python 2.6 has no memoryview
+    RECEIVE_INTO_VIEW = False
+
 
 ILLEGAL_XML_UNICODE_CHARACTERS = [
     (0x00, 0x08), (0x0B, 0x0C), (0x0E, 0x1F), (0x7F, 0x84),
@@ -61,6 +79,68 @@ ILLEGAL_XML_RANGES = ["%s-%s" % (H.unicode_chr(low), H.unicode_chr(high))
 
 ILLEGAL_XML_RE = re.compile(H.unicode_string('[%s]') % H.unicode_string('').join(ILLEGAL_XML_RANGES))
 
+# Characters other than printable ASCII and whitespace, which could be invalid XML characters
+NON_ASCII_RE = re.compile("[^\t\n\r\x20-\x7e]")
+
+# HTML entities and character references
+ENTITY_RE = re.compile("&#?\w+;")
+# Entities which need conversion, XML entities are left untouched
+UNESCAPE_ENTITY_RE = re.compile("&(?!amp;|gt;|lt;)#?\w+;")
+
+# Transaction ID of response data, which has not been parsed
+TRANSACTION_ID_RE = re.compile('transaction_id="(\d+)"')
+
+
+def close_socket(connection):
+    """
+    Shut down and close socket, ignoring errors of socket which has already been closed.
+
+    Keyword arguments:
+    connection -- Socket to close.
+    """
+    if connection is None:
+        return
+    try:
+        connection.shutdown(socket.SHUT_RDWR)
+    except:
+        pass
+    try:
+        connection.close()
+    except:
+        pass
+
+
+class ResponseBuilder(object):
+    """
+    Parser target which builds response document and collects child elements
+    of the response as soon as they have been parsed completely.
+    """
+    def __init__(self):
+        self.builder = ET.TreeBuilder()
+        self.depth = 0
+        self.root = None
+        self.elements = []
+
+    def start(self, tag, attrib):
+        element = self.builder.start(tag, attrib)
+        if self.root is None:
+            self.root = element
+        self.depth += 1
+        return element
+
+    def end(self, tag):
+        element = self.builder.end(tag)
+        self.depth -= 1
+        # Child element of response document has been completed
+        if self.depth == 1:
+            self.elements.append(element)
+        return element
+
+    def data(self, data):
+        self.builder.data(data)
+
+    def close(self):
+        return self.builder.close()
 
 
 class Protocol(object):
@@ -69,12 +149,18 @@ class Protocol(object):
     """
 
     # Maximum amount of data to be received at once by socket
-    read_size = 1024
+    read_size = 8192
 
-    def __init__(self):
-        # Set port number to listen for response
-        self.port = get_value(S.KEY_PORT, S.DEFAULT_PORT)
+    def __init__(self, connection=None):
+        self.server = None
+        self.socket = None
         self.clear()
+        # Init packet which has been sent by debugger engine on connect
+        self.init_packet = None
+        # Use connection which has been accepted by socket server
+        if connection is not None:
+            self.socket = connection
+            self.connected = True
 
     def transaction_id():
         """
@@ -98,14 +184,15 @@ class Protocol(object):
         """
         Clear variables, reset transaction_id, close socket connection.
         """
-        self.buffer = ''
+        self.buffer = bytearray()
+        self.buffer_offset = 0
+        self.responses = {}
+        self.statistics = {}
+        self.read_buffer = None
         self.connected = False
-        self.listening = False
         del self.transaction_id
-        try:
-            self.socket.close()
-        except:
-            pass
+        # Shut down before closing, which wakes up thread waiting for data
+        close_socket(self.socket)
         self.socket = None
 
     def unescape(self, string):
@@ -134,7 +221,51 @@ class Protocol(object):
                 except KeyError:
                     pass
             return text
-        return re.sub("&#?\w+;", convert, string)
+        return ENTITY_RE.sub(convert, string)
+
+    def sanitize(self, data, final=True):
+        """
+        Prepare response data for XML parser, returns sanitized data and
+        remaining data which could not be sanitized yet.
+
+        Keyword arguments:
+        data -- Response data to sanitize.
+        final -- Whether data is the last part of response data.
+        """
+        remaining = data[:0]
+        # Keep possibly incomplete entity at the end for next part of response data
+        if not final:
+            index = data.rfind('&')
+            if index != -1 and data.find(';', index) == -1:
+                remaining = data[index:]
+                data = data[:index]
+
+        # Remove special character quoting, only when data contains entities which need conversion
+        if UNESCAPE_RESPONSE_DATA and '&' in data and UNESCAPE_ENTITY_RE.search(data):
+            data = self.unescape(data)
+
+        # Replace invalid XML characters, data is returned untouched when it contains none
+        if NON_ASCII_RE.search(data):
+            data = ILLEGAL_XML_RE.sub('?', data)
+        return data, remaining
+
+    def receive(self, size=None):
+        """
+        Receive data from debugger engine into read buffer, returns amount of bytes received.
+
+        Keyword arguments:
+        size -- Maximum amount of bytes to receive.
+        """
+        # Allocate receive buffer once, size could have been changed after clear()
+        if self.read_buffer is None or len(self.read_buffer) != self.read_size:
+            self.read_buffer = bytearray(self.read_size)
+        if size is None or size > self.read_size:
+            size = self.read_size
+        received = self.socket.recv_into(self.read_buffer, size)
+        # Connection has been closed by debugger engine
+        if not received:
+            raise ProtocolConnectionException("Connection closed by debugger engine")
+        return received
 
     def read_until_null(self):
         """
@@ -144,52 +275,302 @@ class Protocol(object):
         if self.connected:
             # Get result data from debugger engine
             try:
-                while not '\x00' in self.buffer:
-                    self.buffer += H.data_read(self.socket.recv(self.read_size))
-                data, self.buffer = self.buffer.split('\x00', 1)
-                return data
+                # Only search in data which has not been searched before
+                index = self.buffer.find(b'\x00', self.buffer_offset)
+                while index == -1:
+                    self.buffer_offset = len(self.buffer)
+                    received = self.receive()
+                    self.buffer.extend(self.read_buffer[:received])
+                    index = self.buffer.find(b'\x00', self.buffer_offset)
+                data = self.buffer[:index]
+                del self.buffer[:index + 1]
+                self.buffer_offset = 0
+                # Decode message once it is complete
+                return H.data_read(data)
+            except ProtocolException:
+                raise
             except:
                 e = sys.exc_info()[1]
                 raise ProtocolConnectionException(e)
         else:
             raise ProtocolConnectionException("Xdebug is not connected")
 
-    def read_data(self):
+    def read_length(self):
         """
-        Get response data from debugger engine and verify length of response.
+        Get length in bytes of next response from debugger engine.
         """
-        # Verify length of response data
         length = self.read_until_null()
-        message = self.read_until_null()
-        if int(length) == len(message):
-            return message
-        else:
+        try:
+            return int(length)
+        except ValueError:
+            raise ProtocolException("Invalid length encountered while reading the Xdebug message")
+
+    def read_bytes(self, length):
+        """
+        Get exact amount of bytes from debugger engine.
+
+        Keyword arguments:
+        length -- Amount of bytes to read.
+        """
+        if not self.connected:
+            raise ProtocolConnectionException("Xdebug is not connected")
+        data = bytearray(length)
+        # Use data which has already been received
+        offset = min(length, len(self.buffer))
+        if offset:
+            data[:offset] = self.buffer[:offset]
+            del self.buffer[:offset]
+        self.buffer_offset = 0
+        # Receive remaining data directly into preallocated buffer
+        try:
+            if RECEIVE_INTO_VIEW:
+                view = memoryview(data)
+            while offset < length:
+                if RECEIVE_INTO_VIEW:
+                    received = self.socket.recv_into(view[offset:], length - offset)
+                else:
+                    chunk = self.socket.recv(min(length - offset, self.read_size))
+                    received = len(chunk)
+                    data[offset:offset + received] = chunk
+                # Connection has been closed by debugger engine
+                if not received:
+                    raise ProtocolConnectionException("Connection closed by debugger engine")
+                offset += received
+        except ProtocolException:
+            raise
+        except:
+            e = sys.exc_info()[1]
+            raise ProtocolConnectionException(e)
+        return data
+
+    def read_chunks(self, length):
+        """
+        Get exact amount of bytes from debugger engine, yielding data as soon as it has been received.
+
+        Keyword arguments:
+        length -- Amount of bytes to read.
+        """
+        if not self.connected:
+            raise ProtocolConnectionException("Xdebug is not connected")
+        # Use data which has already been received
+        offset = min(length, len(self.buffer))
+        if offset:
+            data = self.buffer[:offset]
+            del self.buffer[:offset]
+            self.buffer_offset = 0
+            yield data
+        # Receive remaining data
+        while offset < length:
+            try:
+                received = self.receive(length - offset)
+            except ProtocolException:
+                raise
+            except:
+                e = sys.exc_info()[1]
+                raise ProtocolConnectionException(e)
+            offset += received
+            yield self.read_buffer[:received]
+
+    def read_data(self, length=None):
+        """
+        Get response data from debugger engine and verify length of response.
+
+        Keyword arguments:
+        length -- Length in bytes of response data, when it has already been read.
+        """
+        # Read amount of bytes given by length of response data, including NULL terminator
+        if length is None:
+            length = self.read_length()
+        message = self.read_bytes(length + 1)
+        # Verify length of response data by position of NULL terminator
+        if message[-1] != 0:
             raise ProtocolException("Length mismatch encountered while reading the Xdebug message")
+        del message[-1]
+        return H.data_read(message)
 
-    def read(self, return_string=False):
+    def read(self, return_string=False, transaction_id=None):
         """
         Get response from debugger engine as XML document object.
+
+        Only the init packet, which does not belong to a command, should be read without transaction ID,
+        any other response could belong to a command of which the response has not been read.
+
+        Keyword arguments:
+        return_string -- Return response data as string instead of XML document object.
+        transaction_id -- Get response for command with this transaction ID, instead of next response.
         """
-        # Get result data from debugger engine and verify length of response
-        data = self.read_data()
+        while True:
+            # Response has already been received
+            if transaction_id is not None and str(transaction_id) in self.responses:
+                document = self.responses.pop(str(transaction_id))
+                if return_string:
+                    return H.data_read(ET.tostring(document))
+                return document
+
+            # Get result data from debugger engine and verify length of response
+            length = self.read_length()
+            data = self.read_data(length)
+            received = time.time()
+
+            # Show debug output
+            debug('[Response data] %s', data)
+
+            # Return data string
+            if return_string:
+                # Statistics are kept by transaction ID of response, which might not be known by caller
+                match = TRANSACTION_ID_RE.search(data)
+                response_id = match.group(1) if match else None
+                if transaction_id is None or response_id == str(transaction_id):
+                    self.record_statistics(response_id if response_id is not None else transaction_id, length, received)
+                    return data
+
+            # Remove special character quoting and replace invalid XML characters
+            data, _ = self.sanitize(data)
+
+            # Create XML document object
+            document = ET.fromstring(data)
+            self.record_statistics(document.get(dbgp.ATTRIBUTE_TRANSACTION_ID), length, received, time.time() - received)
+            if self.is_response(document, transaction_id):
+                return document
+
+            # Keep response of other command until it is requested
+            self.store_response(document)
+
+    def read_iter(self, transaction_id=None):
+        """
+        Get response from debugger engine, yielding child elements of XML document object
+        as soon as they have been parsed, instead of waiting for complete response.
 
-        # Show debug output
-        debug('[Response data] %s' % data)
+        Keyword arguments:
+        transaction_id -- Get response for command with this transaction ID, instead of next response.
+        """
+        # Response has already been received
+        if transaction_id is not None and str(transaction_id) in self.responses:
+            for child in self.responses.pop(str(transaction_id)):
+                yield child
+            return
+
+        # Unable to parse response data incrementally
+        if not STREAM_RESPONSE_DATA:
+            for child in self.read(transaction_id=transaction_id):
+                yield child
+            return
+
+        while True:
+            # Get length of response data
+            length = self.read_length()
+
+            builder = ResponseBuilder()
+            parser = ET.XMLParser(target=builder)
+            decode = H.new_data_decoder()
+            remaining = decode(b'')
+            chunks = self.read_chunks(length)
+            # Whether response belongs to requested command, known once root element has been parsed
+            stream = None
+            # Time spent on parsing response data
+            parse_time = 0
+            try:
+                # Feed parser with response data as soon as it has been received
+                for chunk in chunks:
+                    data = decode(chunk)
+
+                    # Show debug output
+                    debug('[Response data] %s', data)
+
+                    parse_start = time.time()
+                    data, remaining = self.sanitize(remaining + data, False)
+                    parser.feed(data)
+                    parse_time += time.time() - parse_start
+
+                    if stream is None and builder.root is not None:
+                        stream = self.is_response(builder.root, transaction_id)
+
+                    # Return parsed child elements and release them from document
+                    if stream:
+                        while builder.elements:
+                            element = builder.elements.pop(0)
+                            yield element
+                            builder.root.remove(element)
+
+                received = time.time()
+                data, _ = self.sanitize(remaining + decode(b'', True))
+                parser.feed(data)
+                document = parser.close()
+                self.record_statistics(document.get(dbgp.ATTRIBUTE_TRANSACTION_ID), length, received, parse_time + time.time() - received)
+                if stream is None:
+                    stream = self.is_response(document, transaction_id)
+                if stream:
+                    for element in builder.elements:
+                        yield element
+            finally:
+                # Read unprocessed response data, in case of an error or when not all elements were used
+                for chunk in chunks:
+                    pass
+                terminator = self.read_bytes(1)
 
-        # Return data string
-        if return_string:
-            return data
+            # Verify length of response data by NULL terminator
+            if terminator[0] != 0:
+                raise ProtocolException("Length mismatch encountered while reading the Xdebug message")
 
-        # Remove special character quoting
-        if UNESCAPE_RESPONSE_DATA:
-            data = self.unescape(data)
+            if stream:
+                return
+
+            # Keep response of other command until it is requested
+            self.store_response(document)
+
+    def is_response(self, document, transaction_id=None):
+        """
+        Check if XML document object is the response for command with transaction ID.
+
+        Keyword arguments:
+        document -- Response from debugger engine.
+        transaction_id -- Transaction ID of command, any response matches when undefined.
+        """
+        if transaction_id is None:
+            return True
+        return document.get(dbgp.ATTRIBUTE_TRANSACTION_ID) == str(transaction_id)
+
+    def record_statistics(self, transaction_id, length, received, parse=None):
+        """
+        Complete statistics of command once its response has been received, and keep them in ring buffer.
+
+        Keyword arguments:
+        transaction_id -- Transaction ID of command.
+        length -- Length in bytes of response data.
+        received -- Time at which response data has been received.
+        parse -- Seconds spent on parsing response data.
+        """
+        statistics = self.statistics.pop(str(transaction_id), None)
+        if statistics is None:
+            return
+        statistics['rtt'] = received - statistics['time']
+        statistics['bytes_received'] = length
+        statistics['parse'] = parse
+        S.COMMAND_STATISTICS.append(statistics)
+
+    def store_response(self, document):
+        """
+        Keep response from debugger engine until it is requested by transaction ID.
 
-        # Replace invalid XML characters
-        data = ILLEGAL_XML_RE.sub('?', data)
+        Keyword arguments:
+        document -- Response from debugger engine.
+        """
+        transaction_id = document.get(dbgp.ATTRIBUTE_TRANSACTION_ID)
+        # Stream and notify packets do not belong to a command
+        if transaction_id is None:
+            debug('Ignoring response without transaction ID: %s', document.tag)
+            return
+        self.responses[transaction_id] = document
+
+    def request(self, command, *args, **kwargs):
+        """
+        Send command to the debugger engine without waiting for its response.
+        Returns ProtocolResponse object, which reads the response when it is being used.
 
-        # Create XML document object
-        document = ET.fromstring(data)
-        return document
+        Allows sending multiple commands at once, responses are matched by transaction ID.
+        """
+        transaction_id = self.send(command, *args, **kwargs)
+        return ProtocolResponse(self, transaction_id, self.statistics.get(str(transaction_id)))
 
     def send(self, command, *args, **kwargs):
         """
@@ -220,62 +601,146 @@ class Protocol(object):
             command += ' -- ' + H.base64_encode(expression)
 
         # Show debug output
-        debug('[Send command] %s' % command)
+        debug('[Send command] %s', command)
 
         # Send command to debugger engine
+        data = H.data_write(command + '\x00')
+        sent = time.time()
         try:
-            self.socket.send(H.data_write(command + '\x00'))
+            self.socket.sendall(data)
         except:
             e = sys.exc_info()[1]
             raise ProtocolConnectionException(e)
 
-    def listen(self):
+        # Keep statistics of command until response has been received
+        self.statistics[str(transaction_id)] = {
+            'command': build_command[0],
+            'transaction_id': transaction_id,
+            'time': sent,
+            'bytes_sent': len(data),
+            'bytes_received': None,
+            'rtt': None,
+            'parse': None,
+            'render': None
+        }
+
+        return transaction_id
+
+
+class ProtocolServer(object):
+    """
+    Socket server which keeps accepting connections from debugger engines,
+    each connection being a separate session.
+    """
+
+    # Maximum amount of seconds to wait for init packet of debugger engine
+    init_timeout = 5
+    # Maximum amount of seconds to wait for connection, before checking if server has been stopped
+    accept_timeout = 1
+
+    def __init__(self):
+        # Set port number to listen for response
+        self.port = get_value(S.KEY_PORT, S.DEFAULT_PORT)
+        self.server = None
+        self.listening = False
+        # Sessions which are waiting to be debugged, by application id, IDE key and thread id
+        self.sessions = H.new_dictionary()
+        # Amount of sessions which have been detached by session filter
+        self.dropped = 0
+
+    def clear(self):
         """
-        Create socket server which listens for connection on configured port.
+        Stop listening, close socket server and connections of waiting sessions.
+        """
+        self.listening = False
+        # Shut down before closing, which wakes up thread waiting for connection on most platforms
+        close_socket(self.server)
+        self.server = None
+        for session in H.dictionary_values(self.sessions):
+            session.clear()
+        self.sessions.clear()
+
+    def listen(self, accept):
+        """
+        Create socket server which listens for connections on configured port,
+        until socket server is closed by clear().
+
+        Keyword arguments:
+        accept -- Function which is called with Protocol of each connection, after its init packet has been received.
         """
         # Create socket server
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-        if server:
-            # Configure socket server
+        if not server:
+            raise ProtocolConnectionException('Could not create socket server.')
+
+        # Configure socket server
+        try:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.settimeout(self.accept_timeout)
+            server.bind(('', self.port))
+            server.listen(5)
+            self.server = server
+            self.listening = True
+        except:
+            e = sys.exc_info()[1]
+            raise ProtocolConnectionException(e)
+
+        # Accept incoming connections on configured port
+        while self.listening:
+            # Closing socket server wakes up accept() on most platforms, timeout makes sure it is noticed on all
+            try:
+                connection, address = server.accept()
+            except socket.timeout:
+                continue
+            except:
+                break
+            session = Protocol(connection)
             try:
-                server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                server.settimeout(1)
-                server.bind(('', self.port))
-                server.listen(1)
-                self.listening = True
-                self.socket = None
+                # Do not wait for debugger engine which does not send init packet
+                connection.settimeout(self.init_timeout)
+                session.init_packet = session.read()
+                # Wait for responses without timeout, before session can be used by other threads
+                connection.settimeout(None)
+                accept(session)
             except:
                 e = sys.exc_info()[1]
-                raise ProtocolConnectionException(e)
+                debug('Failed to accept connection: %s', e)
+                session.clear()
 
-            # Accept incoming connection on configured port
-            while self.listening:
-                try:
-                    self.socket, address = server.accept()
-                    self.listening = False
-                except socket.timeout:
-                    pass
+        self.listening = False
+        close_socket(server)
+        self.server = None
 
-            # Check if a connection has been made
-            if self.socket:
-                self.connected = True
-                self.socket.settimeout(None)
-            else:
-                self.connected = False
-                self.listening = False
 
-            # Close socket server
-            try:
-                server.close()
-            except:
-                pass
-            server = None
+class ProtocolResponse(object):
+    """
+    Response for command which has been sent to debugger engine, read when being used.
+    """
+    def __init__(self, protocol, transaction_id, statistics=None):
+        self.protocol = protocol
+        self.transaction_id = transaction_id
+        self.document = None
+        # Time at which command has been sent
+        self.time = time.time()
+        # Statistics of command, to which time spent on rendering response can be added
+        self.statistics = statistics
+
+    def result(self):
+        """
+        Get response as XML document object, waits until response has been received.
+        """
+        if self.document is None:
+            self.document = self.protocol.read(transaction_id=self.transaction_id)
+        return self.document
 
-            # Return socket connection
-            return self.socket
-        else:
-            raise ProtocolConnectionException('Could not create socket server.')
+    def __iter__(self):
+        """
+        Get child elements of response as soon as they have been parsed.
+        """
+        if self.document is not None:
+            return iter(self.document)
+        return self.protocol.read_iter(transaction_id=self.transaction_id)
 
 
 class ProtocolException(Exception):
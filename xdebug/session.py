@@ -1,7 +1,11 @@
 import sublime
 
+import fnmatch
 import sys
 import threading
+import time
+
+from collections import deque
 
 # Helper module
 try:
@@ -31,21 +35,34 @@ from .log import debug, info
 from .protocol import ProtocolConnectionException
 
 # Util module
-from .util import get_real_path
+from .util import cache_evaluation, cache_properties, clear_property_cache, get_cached_evaluation, get_cached_property, get_real_path
 
 # View module
-from .view import DATA_CONTEXT, DATA_STACK, DATA_WATCH, TITLE_WINDOW_WATCH, generate_context_output, generate_stack_output, get_response_properties, has_debug_view, render_regions, show_content, show_file, show_panel_content
+from .view import DATA_CONTEXT, DATA_STACK, DATA_WATCH, TITLE_WINDOW_STACK, TITLE_WINDOW_WATCH, generate_context_output, generate_stack_output, get_context_variable, get_display_limit, get_response_properties, has_debug_view, has_visible_debug_view, has_unloaded_children, render_regions, show_content, show_file, show_panel_content
 
 
 ACTION_EVALUATE = "action_evaluate"
 ACTION_EXECUTE = "action_execute"
+ACTION_EXPAND = "action_expand"
+ACTION_EXPAND_VALUE = "action_expand_value"
+ACTION_FRAME = "action_frame"
 ACTION_INIT = "action_init"
+ACTION_PREFETCH = "action_prefetch"
 ACTION_REMOVE_BREAKPOINT = "action_remove_breakpoint"
 ACTION_SET_BREAKPOINT = "action_set_breakpoint"
 ACTION_STATUS = "action_status"
 ACTION_USER_EXECUTE = "action_user_execute"
 ACTION_WATCH = "action_watch"
 
+# Actions which only refresh values of current break, obsolete once execution continues
+REFRESH_ACTIONS = [ACTION_EXPAND, ACTION_EXPAND_VALUE, ACTION_FRAME, ACTION_PREFETCH, ACTION_WATCH]
+
+# Maximum amount of seconds to wait for response of debugger engine when detaching session
+DETACH_TIMEOUT = 5
+
+# Maximum amount of stack frames to retrieve context of in advance
+PREFETCH_FRAMES = 3
+
 
 def is_connected(show_status=False):
     """
@@ -63,6 +80,170 @@ def is_connected(show_status=False):
     return False
 
 
+def accept_session(protocol):
+    """
+    Handle connection with debugger engine, which has been accepted by socket server.
+    Sessions not matching the session filter are detached.
+
+    NOTE: Runs in thread of socket server.
+
+    Keyword arguments:
+    protocol -- Connection with debugger engine, holding its init packet.
+    """
+    server = S.SESSION_SERVER
+    # Detach right away, before sending any configuration or breakpoints
+    if not is_session_allowed(protocol.init_packet):
+        drop_session(server, protocol, 'not matching session filter')
+        return
+    sublime.set_timeout(lambda: add_session(server, protocol), 0)
+
+
+def add_session(server, protocol):
+    """
+    Add session to table of waiting sessions, and debug it when no other session is being debugged.
+    While another session is being debugged, session is detached unless queueing is enabled in session filter.
+
+    Keyword arguments:
+    server -- Socket server which accepted connection.
+    protocol -- Connection with debugger engine, holding its init packet.
+    """
+    # Socket server has been stopped meanwhile
+    if server is None or server is not S.SESSION_SERVER or not server.listening:
+        protocol.clear()
+        return
+    # Let debugger engine continue without debugging, instead of blocking script until current session has ended
+    if S.SESSION and S.SESSION.connected and not is_session_queued():
+        thread = threading.Thread(target=lambda: drop_session(server, protocol, 'while debugging another session'))
+        thread.daemon = True
+        thread.start()
+        return
+    # Replace previous connection of same application and thread
+    key = get_session_key(protocol.init_packet)
+    if key in server.sessions:
+        server.sessions.pop(key).clear()
+    server.sessions[key] = protocol
+    adopt_session()
+
+
+def adopt_session():
+    """
+    Debug first waiting session, when current session is not connected to debugger engine.
+    """
+    if not S.SESSION or S.SESSION.connected or not S.SESSION_SERVER or not S.SESSION_SERVER.sessions:
+        return
+    key = H.dictionary_keys(S.SESSION_SERVER.sessions)[0]
+    S.SESSION = S.SESSION_SERVER.sessions.pop(key)
+    sublime.set_timeout(lambda: sublime.status_message('Xdebug: Connected'), 100)
+
+    async_session = SocketHandler(ACTION_INIT)
+    async_session.start()
+
+
+def detach_session(protocol):
+    """
+    Stop debugging session, debugger engine continues running script without debugging.
+
+    Keyword arguments:
+    protocol -- Connection with debugger engine.
+    """
+    try:
+        # Do not wait for debugger engine which does not respond
+        protocol.socket.settimeout(DETACH_TIMEOUT)
+        protocol.read(transaction_id=protocol.send(dbgp.DETACH))
+    except ProtocolConnectionException:
+        pass
+    finally:
+        protocol.clear()
+
+
+def drop_session(server, protocol, reason):
+    """
+    Detach session which will not be debugged, and count detached sessions of socket server.
+
+    NOTE: Communicates with debugger engine, do not run in main thread.
+
+    Keyword arguments:
+    server -- Socket server which accepted connection.
+    protocol -- Connection with debugger engine, holding its init packet.
+    reason -- Why session is not being debugged.
+    """
+    init = protocol.init_packet
+    detach_session(protocol)
+    if server is not None:
+        server.dropped += 1
+        dropped = server.dropped
+        info('Detached session %s: idekey=%s, fileuri=%s (%d detached)', reason, init.get(dbgp.INIT_IDEKEY), init.get(dbgp.INIT_FILEURI), dropped)
+        sublime.set_timeout(lambda: sublime.status_message('Xdebug: Detached %d session(s), last one %s' % (dropped, reason)), 100)
+
+
+def get_prefetch_depths(depth):
+    """
+    Get stack depths of frames to retrieve context of in advance, in order of likely use.
+    Frames closest to selected frame come first, calling frame before called frame.
+
+    Keyword arguments:
+    depth -- Stack depth of selected frame.
+    """
+    depths = []
+    for distance in range(1, S.STACK_LEVELS):
+        for frame in (depth + distance, depth - distance):
+            if 0 <= frame < S.STACK_LEVELS and frame not in S.CONTEXT_FRAMES:
+                depths.append(frame)
+    return depths[:PREFETCH_FRAMES]
+
+
+def get_session_key(init):
+    """
+    Get key which identifies session, by application id, IDE key and thread id of init packet.
+
+    Keyword arguments:
+    init -- Init packet of debugger engine.
+    """
+    return (init.get(dbgp.INIT_APPID), init.get(dbgp.INIT_IDEKEY), init.get(dbgp.INIT_THREAD))
+
+
+def is_session_queued():
+    """
+    Check if sessions, which connect while another session is being debugged, should wait for their turn.
+    """
+    session_filter = get_value(S.KEY_SESSION_FILTER)
+    return isinstance(session_filter, dict) and session_filter.get('queue') is True
+
+
+def is_session_allowed(init):
+    """
+    Check if session matches configured session filter.
+
+    Keyword arguments:
+    init -- Init packet of debugger engine.
+    """
+    session_filter = get_value(S.KEY_SESSION_FILTER)
+    if not isinstance(session_filter, dict):
+        return True
+
+    # IDE key should match (one of) configured IDE key(s)
+    ide_key = session_filter.get('idekey')
+    if ide_key:
+        if not isinstance(ide_key, list):
+            ide_key = [ide_key]
+        if init.get(dbgp.INIT_IDEKEY) not in ide_key:
+            return False
+
+    # File uri should match (one of) configured pattern(s)
+    fileuri_pattern = session_filter.get('fileuri')
+    if fileuri_pattern:
+        if not isinstance(fileuri_pattern, list):
+            fileuri_pattern = [fileuri_pattern]
+        # Match against path of file on server, without scheme
+        fileuri = H.url_decode(init.get(dbgp.INIT_FILEURI) or '')
+        if fileuri.startswith('file://'):
+            fileuri = fileuri[len('file://'):]
+        if not [pattern for pattern in fileuri_pattern if fnmatch.fnmatchcase(fileuri, pattern)]:
+            return False
+
+    return True
+
+
 def connection_error(message):
     """
     Template for showing error message on connection error/loss.
@@ -81,10 +262,15 @@ def connection_error(message):
     finally:
         S.SESSION = None
         S.SESSION_BUSY = False
+        # Stop listening for other sessions
+        if S.SESSION_SERVER is not None:
+            S.SESSION_SERVER.clear()
+            S.SESSION_SERVER = None
         S.BREAKPOINT_EXCEPTION = None
         S.BREAKPOINT_ROW = None
         S.BREAKPOINT_RUN = None
         S.CONTEXT_DATA.clear()
+        clear_property_cache()
         async_session = SocketHandler(ACTION_WATCH)
         async_session.start()
     # Reset layout
@@ -93,12 +279,81 @@ def connection_error(message):
     render_regions()
 
 
-class SocketHandler(threading.Thread):
-    def __init__(self, action, **options):
+class SessionWorker(threading.Thread):
+    """
+    Single thread which runs actions of socket handlers one at a time, in order of request.
+    Prevents commands and responses of different actions from interleaving on the connection.
+    """
+    def __init__(self):
         threading.Thread.__init__(self)
+        self.daemon = True
+        self.condition = threading.Condition()
+        self.pending = deque()
+
+    def has_pending(self, action=None):
+        """
+        Determine if an action is waiting to be run.
+
+        Keyword arguments:
+        action -- Action of socket handler, any action when undefined.
+        """
+        with self.condition:
+            return any(action is None or handler.action == action for handler in self.pending)
+
+    def put(self, handler):
+        """
+        Add socket handler to queue of actions.
+
+        Keyword arguments:
+        handler -- Socket handler with action to run.
+        """
+        with self.condition:
+            # Values of current break will be retrieved again after continuation
+            if handler.action == ACTION_EXECUTE:
+                self.pending = deque(pending for pending in self.pending if pending.action not in REFRESH_ACTIONS)
+            # Same refresh is already waiting to be run
+            elif handler.action in REFRESH_ACTIONS:
+                for pending in self.pending:
+                    if pending.action == handler.action and pending.options == handler.options:
+                        return
+            self.pending.append(handler)
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                handler = self.pending.popleft()
+            # Keep running next actions when action fails
+            try:
+                handler.run()
+            except:
+                e = sys.exc_info()[1]
+                info('Failed to run %s: %s', handler.action, e)
+
+
+class SocketHandler(object):
+    def __init__(self, action, **options):
         self.action = action
         self.options = options
 
+    def start(self):
+        """
+        Run action in session worker thread, after previously requested actions.
+        """
+        if S.SESSION_WORKER is None or not S.SESSION_WORKER.is_alive():
+            S.SESSION_WORKER = SessionWorker()
+            S.SESSION_WORKER.start()
+        S.SESSION_WORKER.put(self)
+
+    def is_superseded(self):
+        """
+        Determine if continuation has been requested after this action,
+        which makes retrieving values of current break obsolete.
+        """
+        return S.SESSION_WORKER is not None and S.SESSION_WORKER.has_pending(ACTION_EXECUTE)
+
     def get_option(self, option, default_value=None):
         if option in self.options.keys():
             return self.options[option]
@@ -138,6 +393,8 @@ class SocketHandler(threading.Thread):
         # Make sure an action is defined
         if not self.action:
             return
+        # Session could be stopped while running action
+        session = S.SESSION
         try:
             S.SESSION_BUSY = True
             # Evaluate
@@ -146,9 +403,21 @@ class SocketHandler(threading.Thread):
             # Execute
             elif self.action == ACTION_EXECUTE:
                 self.execute(self.get_option('command'))
+            # Expand property
+            elif self.action == ACTION_EXPAND:
+                self.expand_property(self.get_option('name'))
+            # Expand value of property
+            elif self.action == ACTION_EXPAND_VALUE:
+                self.expand_value(self.get_option('name'))
+            # Select stack frame
+            elif self.action == ACTION_FRAME:
+                self.select_frame(self.get_option('depth'))
             # Init
             elif self.action == ACTION_INIT:
                 self.init()
+            # Prefetch context of stack frames
+            elif self.action == ACTION_PREFETCH:
+                self.prefetch_frames(self.get_option('depths'))
             # Remove breakpoint
             elif self.action == ACTION_REMOVE_BREAKPOINT:
                 self.remove_breakpoint(self.get_option('breakpoint_id'))
@@ -164,10 +433,11 @@ class SocketHandler(threading.Thread):
             # Watch expression
             elif self.action == ACTION_WATCH:
                 self.watch_expression()
-        # Show dialog on connection error
+        # Show dialog on connection error, unless connection has been closed by stopping session
         except ProtocolConnectionException:
             e = sys.exc_info()[1]
-            self.timeout(lambda: connection_error("%s" % e))
+            if S.SESSION is session:
+                self.timeout(lambda: connection_error("%s" % e))
         finally:
             S.SESSION_BUSY = False
 
@@ -176,13 +446,13 @@ class SocketHandler(threading.Thread):
         if not expression or not is_connected():
             return
         # Send 'eval' command to debugger engine with code to evaluate
-        S.SESSION.send(dbgp.EVAL, expression=expression)
+        transaction_id = S.SESSION.send(dbgp.EVAL, expression=expression)
         if get_value(S.KEY_PRETTY_OUTPUT):
-            response = S.SESSION.read()
+            response = S.SESSION.read(transaction_id=transaction_id)
             properties = get_response_properties(response, expression)
             response = generate_context_output(properties)
         else:
-            response = S.SESSION.read(return_string=True)
+            response = S.SESSION.read(return_string=True, transaction_id=transaction_id)
 
         # Show response data in output panel
         self.timeout(lambda: show_panel_content(response))
@@ -194,14 +464,14 @@ class SocketHandler(threading.Thread):
             return
 
         # Send command to debugger engine
-        S.SESSION.send(command)
-        response = S.SESSION.read()
+        response = S.SESSION.read(transaction_id=S.SESSION.send(command))
 
         # Reset previous breakpoint values
         S.BREAKPOINT_EXCEPTION = None
         S.BREAKPOINT_ROW = None
         S.CONTEXT_DATA.clear()
-        self.watch_expression()
+        clear_property_cache()
+        self.watch_expression([])
         # Set debug layout
         self.run_command('xdebug_layout')
 
@@ -236,18 +506,33 @@ class SocketHandler(threading.Thread):
                 # Focus/Open file window view
                 self.timeout(lambda: show_file(filename, lineno))
 
-        # On breakpoint get context variables and stack history
-        if response.get(dbgp.ATTRIBUTE_STATUS) == dbgp.STATUS_BREAK:
+        # On breakpoint get context variables and stack history, unless execution will continue right away
+        if response.get(dbgp.ATTRIBUTE_STATUS) == dbgp.STATUS_BREAK and not self.is_superseded():
+            # Send commands at once, instead of waiting for each response
+            context_requests = self.request_context_values()
+            stack_request = self.request_stack_values()
+            watch_requests = self.request_watch_values()
+
             # Context variables
-            context = self.get_context_values()
+            context = self.get_context_values(context_requests)
             self.timeout(lambda: show_content(DATA_CONTEXT, context))
 
             # Stack history
-            stack = self.get_stack_values()
+            stack = self.get_stack_values(stack_request)
             self.timeout(lambda: show_content(DATA_STACK, stack))
 
+            # Context of calling stack frames in advance, when stack can be navigated
+            try:
+                prefetch = has_visible_debug_view(TITLE_WINDOW_STACK)
+            except RuntimeError:
+                # Sublime Text 2 API is not available in thread
+                prefetch = True
+            depths = get_prefetch_depths(0)
+            if prefetch and depths:
+                SocketHandler(ACTION_PREFETCH, depths=depths).start()
+
             # Watch expressions
-            self.watch_expression()
+            self.watch_expression(watch_requests)
 
         # Reload session when session stopped, by reaching end of file or interruption
         if response.get(dbgp.ATTRIBUTE_STATUS) == dbgp.STATUS_STOPPING or response.get(dbgp.ATTRIBUTE_STATUS) == dbgp.STATUS_STOPPED:
@@ -259,116 +544,357 @@ class SocketHandler(threading.Thread):
         self.timeout(lambda: render_regions())
 
 
-    def get_context_values(self):
+    def expand_property(self, name):
         """
-        Get variables in current context.
+        Retrieve next page of children for variable in current context,
+        which have not been retrieved with context variables.
+
+        Keyword arguments:
+        name -- Full name of variable in context data.
         """
-        if not is_connected():
+        if not name or not is_connected():
             return
 
-        context = H.new_dictionary()
+        depth = S.CONTEXT_DEPTH
+        variable = get_cached_property(name, depth=depth)
+        if variable is None:
+            variable = get_context_variable(S.CONTEXT_DATA, name)
+        if not has_unloaded_children(variable):
+            return
+
+        # Determine page of children to retrieve
+        children = variable.children if isinstance(variable.children, dict) else H.new_dictionary()
+        page_size = get_value(S.KEY_MAX_CHILDREN)
+        if not (H.is_number(page_size) or H.is_digit(page_size)) or int(page_size) < 1:
+            page_size = 32
+        page = len(children) // int(page_size)
+
+        # Get children of variable
+        fullname = '"%s"' % name.replace('\\', '\\\\').replace('"', '\\"')
+        context_id = variable.context_id if variable.context_id is not None else 0
+        response = S.SESSION.read(transaction_id=S.SESSION.send(dbgp.PROPERTY_GET, n=fullname, d=depth, c=context_id, p=page))
+        index = {}
+        properties = get_response_properties(response, name, context_id, index, variable.parent)
+        if name not in properties:
+            return
+
+        # Append retrieved children to variable in context data
+        if isinstance(properties[name].children, dict):
+            for child in properties[name].children.values():
+                child.parent = variable
+            children.update(properties[name].children)
+        variable.children = children
+        variable.numchildren = properties[name].numchildren
+        index[name] = variable
+        cache_properties(index, depth)
+
+        # Show updated context variables
+        max_length, max_children = get_display_limit(DATA_CONTEXT)
+        context = generate_context_output(S.CONTEXT_DATA, max_length=max_length, max_children=max_children)
+        self.timeout(lambda: show_content(DATA_CONTEXT, context))
+
+        # Show variable with retrieved children in output panel
+        variables = H.new_dictionary()
+        variables[name] = variable
+        output = generate_context_output(variables)
+        self.timeout(lambda: show_panel_content(output))
+
+    def expand_value(self, name):
+        """
+        Retrieve complete value of variable in current context,
+        which has been truncated by maximum amount of data to retrieve.
+
+        Keyword arguments:
+        name -- Full name of variable in context data.
+        """
+        if not name or not is_connected():
+            return
+
+        depth = S.CONTEXT_DEPTH
+        variable = get_cached_property(name, depth=depth)
+        if variable is None:
+            variable = get_context_variable(S.CONTEXT_DATA, name)
+        if variable is None or not variable.is_truncated():
+            return
+
+        # Get value of variable, using size of value as maximum amount of data
+        fullname = '"%s"' % name.replace('\\', '\\\\').replace('"', '\\"')
+        context_id = variable.context_id if variable.context_id is not None else 0
+        response = S.SESSION.read(transaction_id=S.SESSION.send(dbgp.PROPERTY_VALUE, n=fullname, d=depth, c=context_id, m=variable.size))
+        if not response.text:
+            return
+
+        # Replace truncated value of variable, keep value encoded until it is used
+        variable.value = None
+        if response.get(dbgp.PROPERTY_ENCODING) == 'base64':
+            variable.encoded = response.text
+        else:
+            variable.value = response.text
+        variable.size = response.get(dbgp.PROPERTY_SIZE, variable.size)
+
+        # Show updated context variables
+        max_length, max_children = get_display_limit(DATA_CONTEXT)
+        context = generate_context_output(S.CONTEXT_DATA, max_length=max_length, max_children=max_children)
+        self.timeout(lambda: show_content(DATA_CONTEXT, context))
+
+        # Show variable with complete value in output panel
+        variables = H.new_dictionary()
+        variables[name] = variable
+        output = generate_context_output(variables)
+        self.timeout(lambda: show_panel_content(output))
+
+    def prefetch_frames(self, depths):
+        """
+        Retrieve context of stack frames in advance, one frame at a time,
+        giving way to other actions which are waiting to be run.
+
+        Keyword arguments:
+        depths -- Stack depths of frames, in order of retrieval.
+        """
+        depths = [depth for depth in depths if depth not in S.CONTEXT_FRAMES]
+        while depths and is_connected():
+            # Obsolete once execution continues
+            if self.is_superseded():
+                return
+            # Continue with remaining frames after waiting actions have been run
+            if S.SESSION_WORKER is not None and S.SESSION_WORKER.has_pending():
+                SocketHandler(ACTION_PREFETCH, depths=depths).start()
+                return
+            depth = depths.pop(0)
+            self.load_context_values(self.request_context_values(depth), depth)
+
+    def select_frame(self, depth):
+        """
+        Show variables of stack frame in context view, using context of frame
+        when already retrieved during current break.
+
+        Keyword arguments:
+        depth -- Stack depth of frame.
+        """
+        if not is_connected() or not (H.is_number(depth) or H.is_digit(depth)):
+            return
+        depth = int(depth)
+        if depth == S.CONTEXT_DEPTH and S.CONTEXT_DATA:
+            return
+
+        context = S.CONTEXT_FRAMES.get(depth)
+        if context is None:
+            context = self.load_context_values(self.request_context_values(depth), depth)
+        S.CONTEXT_DEPTH = depth
+        S.CONTEXT_DATA = context
+
+        max_length, max_children = get_display_limit(DATA_CONTEXT)
+        output = generate_context_output(context, max_length=max_length, max_children=max_children)
+        self.timeout(lambda: show_content(DATA_CONTEXT, output))
+        self.status_message('Xdebug: Stack frame %d' % depth)
+
+        # Context of neighbouring stack frames
+        depths = get_prefetch_depths(depth)
+        if depths:
+            SocketHandler(ACTION_PREFETCH, depths=depths).start()
+
+    def request_context_values(self, depth=0):
+        """
+        Send commands for getting variables in current context, without waiting for response.
+
+        Keyword arguments:
+        depth -- Stack depth of frame.
+        """
+        requests = []
+        if not is_connected():
+            return requests
+
         try:
             # Super global variables
             if get_value(S.KEY_SUPER_GLOBALS):
-                S.SESSION.send(dbgp.CONTEXT_GET, c=1)
-                response = S.SESSION.read()
-                context.update(get_response_properties(response))
+                requests.append((1, S.SESSION.request(dbgp.CONTEXT_GET, d=depth, c=1)))
 
             # Local variables
-            S.SESSION.send(dbgp.CONTEXT_GET)
-            response = S.SESSION.read()
-            context.update(get_response_properties(response))
+            requests.append((0, S.SESSION.request(dbgp.CONTEXT_GET, d=depth, c=0)))
         except ProtocolConnectionException:
             e = sys.exc_info()[1]
             self.timeout(lambda: connection_error("%s" % e))
+        return requests
+
+    def load_context_values(self, requests, depth=0):
+        """
+        Read variables of stack frame and store them in cache of current break.
+
+        Keyword arguments:
+        requests -- Responses of commands already sent by request_context_values().
+        depth -- Stack depth of frame.
+        """
+        context = H.new_dictionary()
+        index = {}
+        try:
+            # Read properties as soon as they have been received
+            for context_id, response in requests:
+                context.update(get_response_properties(response, context_id=context_id, index=index))
+        except ProtocolConnectionException:
+            e = sys.exc_info()[1]
+            self.timeout(lambda: connection_error("%s" % e))
+
+        S.CONTEXT_FRAMES[depth] = context
+        cache_properties(index, depth)
+        return context
+
+    def get_context_values(self, requests=None):
+        """
+        Get variables in current context.
 
-        # Store context variables in session
+        Keyword arguments:
+        requests -- Responses of commands already sent by request_context_values().
+        """
+        if not is_connected():
+            return
+
+        if requests is None:
+            requests = self.request_context_values()
+
+        # Store context variables of current stack frame in session
+        context = self.load_context_values(requests)
+        S.CONTEXT_DEPTH = 0
         S.CONTEXT_DATA = context
 
-        return generate_context_output(context)
+        render_start = time.time()
+        max_length, max_children = get_display_limit(DATA_CONTEXT)
+        output = generate_context_output(context, max_length=max_length, max_children=max_children)
+        # Add time spent on rendering to statistics of local variables
+        if requests and requests[-1][1].statistics is not None:
+            requests[-1][1].statistics['render'] = time.time() - render_start
+        return output
+
 
+    def request_stack_values(self):
+        """
+        Send command for getting stack information, without waiting for response.
+        """
+        if is_connected():
+            try:
+                return S.SESSION.request(dbgp.STACK_GET)
+            except ProtocolConnectionException:
+                e = sys.exc_info()[1]
+                self.timeout(lambda: connection_error("%s" % e))
 
-    def get_stack_values(self):
+    def get_stack_values(self, request=None):
         """
         Get stack information for current context.
+
+        Keyword arguments:
+        request -- Response of command already sent by request_stack_values().
         """
         response = None
         if is_connected():
+            if request is None:
+                request = self.request_stack_values()
             try:
                 # Get stack information
-                S.SESSION.send(dbgp.STACK_GET)
-                response = S.SESSION.read()
+                if request is not None:
+                    response = request.result()
+                    # Amount of frames which can be selected
+                    S.STACK_LEVELS = len([child for child in response if child.tag == dbgp.ELEMENT_STACK or child.tag == dbgp.ELEMENT_PATH_STACK])
             except ProtocolConnectionException:
                 e = sys.exc_info()[1]
                 self.timeout(lambda: connection_error("%s" % e))
-        return generate_stack_output(response)
+        render_start = time.time()
+        output = generate_stack_output(response)
+        # Add time spent on rendering to statistics of command
+        if request is not None and request.statistics is not None:
+            request.statistics['render'] = time.time() - render_start
+        return output
 
 
-    def get_watch_values(self):
+    def request_watch_values(self):
         """
-        Evaluate all watch expressions in current context.
+        Send eval command for all enabled watch expressions at once, without waiting for response.
         """
-        for index, item in enumerate(S.WATCH):
-            # Reset value for watch expression
-            S.WATCH[index]['value'] = None
+        requests = []
+        # Evaluate watch expressions when connected to debugger engine
+        if not is_connected():
+            return requests
+
+        # Do not evaluate watch expressions when Watch view is not visible
+        try:
+            if not has_visible_debug_view(TITLE_WINDOW_WATCH):
+                return requests
+        except RuntimeError:
+            # Sublime Text 2 API is not available in thread
+            pass
 
-            # Evaluate watch expression when connected to debugger engine
-            if is_connected():
+        try:
+            for item in S.WATCH:
                 if item['enabled']:
-                    watch_value = None
-                    try:
-                        S.SESSION.send(dbgp.EVAL, expression=item['expression'])
-                        response = S.SESSION.read()
+                    # Use value of expression when already evaluated during current break
+                    value = get_cached_evaluation(item['expression'])
+                    if value is not None:
+                        requests.append((item, value, None))
+                    else:
+                        requests.append((item, None, S.SESSION.request(dbgp.EVAL, expression=item['expression'])))
+        except ProtocolConnectionException:
+            pass
+        return requests
 
-                        watch_value = get_response_properties(response, item['expression'])
-                    except ProtocolConnectionException:
-                        pass
+    def get_watch_values(self, requests=None):
+        """
+        Evaluate all watch expressions in current context.
 
-                    S.WATCH[index]['value'] = watch_value
+        Keyword arguments:
+        requests -- Responses of commands already sent by request_watch_values().
+        """
+        if requests is None:
+            requests = self.request_watch_values()
+
+        # Reset value for watch expressions
+        for item in S.WATCH:
+            item['value'] = None
+
+        # Read response for each evaluated watch expression
+        evaluated = []
+        for item, value, request in requests:
+            if request is None:
+                item['value'] = value
+                continue
+            try:
+                item['value'] = get_response_properties(request.result(), item['expression'])
+                cache_evaluation(item['expression'], item['value'])
+                evaluated.append(request)
+            except ProtocolConnectionException:
+                pass
+
+        if evaluated:
+            latency = (time.time() - evaluated[0].time) * 1000
+            debug('Evaluated %d watch expression(s) in %.1f ms', len(evaluated), latency)
 
 
     def init(self):
         if not is_connected():
             return
 
-        # Connection initialization
-        init = S.SESSION.read()
+        # Connection initialization, init packet has already been read when connection was accepted
+        init = S.SESSION.init_packet
+        if init is None:
+            init = S.SESSION.read()
 
         # More detailed internal information on properties
-        S.SESSION.send(dbgp.FEATURE_SET, n='show_hidden', v=1)
-        response = S.SESSION.read()
+        response = S.SESSION.read(transaction_id=S.SESSION.send(dbgp.FEATURE_SET, n='show_hidden', v=1))
 
         # Set max children limit
         max_children = get_value(S.KEY_MAX_CHILDREN)
         if max_children is not False and max_children is not True and (H.is_number(max_children) or H.is_digit(max_children)):
-            S.SESSION.send(dbgp.FEATURE_SET, n=dbgp.FEATURE_NAME_MAXCHILDREN, v=max_children)
-            response = S.SESSION.read()
+            response = S.SESSION.read(transaction_id=S.SESSION.send(dbgp.FEATURE_SET, n=dbgp.FEATURE_NAME_MAXCHILDREN, v=max_children))
 
         # Set max data limit
         max_data = get_value(S.KEY_MAX_DATA)
         if max_data is not False and max_data is not True and (H.is_number(max_data) or H.is_digit(max_data)):
-            S.SESSION.send(dbgp.FEATURE_SET, n=dbgp.FEATURE_NAME_MAXDATA, v=max_data)
-            response = S.SESSION.read()
+            response = S.SESSION.read(transaction_id=S.SESSION.send(dbgp.FEATURE_SET, n=dbgp.FEATURE_NAME_MAXDATA, v=max_data))
 
         # Set max depth limit
         max_depth = get_value(S.KEY_MAX_DEPTH)
         if max_depth is not False and max_depth is not True and (H.is_number(max_depth) or H.is_digit(max_depth)):
-            S.SESSION.send(dbgp.FEATURE_SET, n=dbgp.FEATURE_NAME_MAXDEPTH, v=max_depth)
-            response = S.SESSION.read()
-
-        # Set breakpoints for files
-        for filename, breakpoint_data in S.BREAKPOINT.items():
-            if breakpoint_data:
-                for lineno, bp in breakpoint_data.items():
-                    if bp['enabled']:
-                        self.set_breakpoint(filename, lineno, bp['expression'])
-                        debug('breakpoint_set: ' + filename + ':' + lineno)
+            response = S.SESSION.read(transaction_id=S.SESSION.send(dbgp.FEATURE_SET, n=dbgp.FEATURE_NAME_MAXDEPTH, v=max_depth))
 
-        # Set breakpoints for exceptions
-        break_on_exception = get_value(S.KEY_BREAK_ON_EXCEPTION)
-        if isinstance(break_on_exception, list):
-            for exception_name in break_on_exception:
-                self.set_exception(exception_name)
+        # Set breakpoints for files and exceptions
+        self.sync_breakpoints()
 
         # Determine if client should break at first line on connect
         if get_value(S.KEY_BREAK_ON_START):
@@ -383,19 +909,24 @@ class SocketHandler(threading.Thread):
             # Focus/Open file window view
             self.timeout(lambda: show_file(filename, 1))
 
+            # Send commands at once, instead of waiting for each response
+            context_requests = self.request_context_values()
+            stack_request = self.request_stack_values()
+            watch_requests = self.request_watch_values()
+
             # Context variables
-            context = self.get_context_values()
+            context = self.get_context_values(context_requests)
             self.timeout(lambda: show_content(DATA_CONTEXT, context))
 
             # Stack history
-            stack = self.get_stack_values()
+            stack = self.get_stack_values(stack_request)
             if not stack:
                 stack = H.unicode_string('[{level}] {filename}.{where}:{lineno}\n' \
                                           .format(level=0, where='{main}', lineno=1, filename=fileuri))
             self.timeout(lambda: show_content(DATA_STACK, stack))
 
             # Watch expressions
-            self.watch_expression()
+            self.watch_expression(watch_requests)
         else:
             # Tell script to run it's process
             self.run_command('xdebug_execute', {'command': 'run'})
@@ -405,8 +936,7 @@ class SocketHandler(threading.Thread):
         if not breakpoint_id or not is_connected():
             return
 
-        S.SESSION.send(dbgp.BREAKPOINT_REMOVE, d=breakpoint_id)
-        response = S.SESSION.read()
+        response = S.SESSION.read(transaction_id=S.SESSION.send(dbgp.BREAKPOINT_REMOVE, d=breakpoint_id))
 
 
     def set_breakpoint(self, filename, lineno, expression=None):
@@ -416,20 +946,45 @@ class SocketHandler(threading.Thread):
         # Get path of file on server
         fileuri = get_real_path(filename, True)
         # Set breakpoint
-        S.SESSION.send(dbgp.BREAKPOINT_SET, t='line', f=fileuri, n=lineno, expression=expression)
-        response = S.SESSION.read()
+        response = S.SESSION.read(transaction_id=S.SESSION.send(dbgp.BREAKPOINT_SET, t='line', f=fileuri, n=lineno, expression=expression))
         # Update breakpoint id
         breakpoint_id = response.get(dbgp.ATTRIBUTE_BREAKPOINT_ID)
         if breakpoint_id:
             S.BREAKPOINT[filename][lineno]['id'] = breakpoint_id
 
 
-    def set_exception(self, exception):
+    def sync_breakpoints(self):
+        """
+        Set enabled breakpoints for files and exceptions in debugger engine, sending all commands at once.
+        """
         if not is_connected():
             return
 
-        S.SESSION.send(dbgp.BREAKPOINT_SET, t='exception', x='"%s"' % exception)
-        response = S.SESSION.read()
+        # Send commands at once, instead of waiting for each response
+        requests = []
+        for filename, breakpoint_data in S.BREAKPOINT.items():
+            if breakpoint_data:
+                for lineno, bp in breakpoint_data.items():
+                    if not bp['enabled']:
+                        continue
+                    fileuri = get_real_path(filename, True)
+                    requests.append((bp, S.SESSION.request(dbgp.BREAKPOINT_SET, t=dbgp.BREAKPOINT_TYPE_LINE, f=fileuri, n=lineno, expression=bp['expression'])))
+                    debug('breakpoint_set: %s:%s', filename, lineno)
+
+        break_on_exception = get_value(S.KEY_BREAK_ON_EXCEPTION)
+        if isinstance(break_on_exception, list):
+            for exception_name in break_on_exception:
+                requests.append((None, S.SESSION.request(dbgp.BREAKPOINT_SET, t=dbgp.BREAKPOINT_TYPE_EXCEPTION, x='"%s"' % exception_name)))
+
+        # Update breakpoint ids, once responses have been received
+        for bp, request in requests:
+            breakpoint_id = request.result().get(dbgp.ATTRIBUTE_BREAKPOINT_ID)
+            if bp is not None and breakpoint_id:
+                bp['id'] = breakpoint_id
+
+        if requests:
+            latency = (time.time() - requests[0][1].time) * 1000
+            debug('Synchronized %d breakpoint(s) in %.1f ms', len(requests), latency)
 
 
     def status(self):
@@ -437,8 +992,7 @@ class SocketHandler(threading.Thread):
             return
 
         # Send 'status' command to debugger engine
-        S.SESSION.send(dbgp.STATUS)
-        response = S.SESSION.read()
+        response = S.SESSION.read(transaction_id=S.SESSION.send(dbgp.STATUS))
         # Show response in status bar
         self.status_message("Xdebug status: " + response.get(dbgp.ATTRIBUTE_REASON) + ' - ' + response.get(dbgp.ATTRIBUTE_STATUS))
 
@@ -448,16 +1002,15 @@ class SocketHandler(threading.Thread):
             return
 
         # Send command to debugger engine
-        S.SESSION.send(command, args)
-        response = S.SESSION.read(return_string=True)
+        response = S.SESSION.read(return_string=True, transaction_id=S.SESSION.send(command, args))
 
         # Show response data in output panel
         self.timeout(lambda: show_panel_content(response))
 
 
-    def watch_expression(self):
+    def watch_expression(self, requests=None):
         # Evaluate watch expressions
-        self.get_watch_values()
+        self.get_watch_values(requests)
         # Show watch expression
         self.timeout(lambda: self._watch_expression(self.get_option('check_watch_view', False)))
 
@@ -1,3 +1,5 @@
+from collections import deque
+
 DEFAULT_PORT = 9000
 DEFAULT_IDE_KEY = 'sublime.xdebug'
 
@@ -7,6 +9,7 @@ PACKAGE_FOLDER = None
 FILE_LOG_OUTPUT = 'Xdebug.log'
 FILE_BREAKPOINT_DATA = 'Xdebug.breakpoints'
 FILE_PACKAGE_SETTINGS = 'Xdebug.sublime-settings'
+FILE_STATISTICS_DATA = 'Xdebug.statistics'
 FILE_WATCH_DATA = 'Xdebug.expressions'
 
 KEY_SETTINGS = 'settings'
@@ -20,6 +23,7 @@ KEY_SUPER_GLOBALS = "super_globals"
 KEY_MAX_CHILDREN = "max_children"
 KEY_MAX_DATA = "max_data"
 KEY_MAX_DEPTH = "max_depth"
+KEY_DISPLAY_LIMIT = "display_limit"
 KEY_BREAK_ON_START = "break_on_start"
 KEY_BREAK_ON_EXCEPTION = "break_on_exception"
 KEY_CLOSE_ON_STOP = "close_on_stop"
@@ -46,12 +50,15 @@ KEY_CURRENT_LINE = 'current_line'
 
 KEY_PYTHON_PATH = "python_path"
 KEY_DEBUG = "debug"
+KEY_SESSION_FILTER = "session_filter"
 
 # Region scope sources
 REGION_KEY_BREAKPOINT = 'xdebug_breakpoint'
+REGION_KEY_CHANGED = 'xdebug_changed'
 REGION_KEY_CURRENT = 'xdebug_current'
 REGION_KEY_DISABLED = 'xdebug_disabled'
 REGION_SCOPE_BREAKPOINT = 'comment.line.settings'
+REGION_SCOPE_CHANGED = 'markup.changed'
 REGION_SCOPE_CURRENT = 'string.quoted.settings'
 
 # Window layout for debugging output
@@ -71,12 +78,35 @@ RESTORE_LAYOUT = None
 RESTORE_INDEX = None
 
 SESSION_BUSY = False
+# Thread which runs actions of debugging session one at a time
+SESSION_WORKER = None
 
 SESSION = None
+# Socket server which accepts connections from debugger engines
+SESSION_SERVER = None
 BREAKPOINT = {}
 CONTEXT_DATA = {}
 WATCH = []
 
+# Stack depth of frame which context is shown, amount of frames in stack of current break
+CONTEXT_DEPTH = 0
+STACK_LEVELS = 0
+# Context data of each stack frame of current break, by stack depth
+CONTEXT_FRAMES = {}
+
+# Properties and evaluated expressions of current break, by (stack depth, context id, fullname)
+PROPERTY_CACHE = {}
+PROPERTY_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+# Path mapping built from configuration, reset when configuration changes
+PATH_MAPPING = None
+
+# Statistics of most recent commands sent to debugger engine
+COMMAND_STATISTICS = deque(maxlen=1000)
+
+# Hashes of lines in debug views, by view id, for only updating changed lines
+VIEW_HASHES = {}
+
 BREAKPOINT_EXCEPTION = None
 # Breakpoint line number in script being debugged
 BREAKPOINT_ROW = None
@@ -87,6 +117,8 @@ SHOW_ROW_ONLOAD = {}
 
 CONFIG_PROJECT = None
 CONFIG_PACKAGE = None
+# Snapshot of package/project configuration values, reset when values have been changed
+CONFIG = None
 CONFIG_KEYS = [
 	KEY_PATH_MAPPING,
 	KEY_URL,
@@ -96,6 +128,7 @@ CONFIG_KEYS = [
 	KEY_MAX_CHILDREN,
 	KEY_MAX_DATA,
 	KEY_MAX_DEPTH,
+	KEY_DISPLAY_LIMIT,
 	KEY_BREAK_ON_START,
 	KEY_BREAK_ON_EXCEPTION,
 	KEY_CLOSE_ON_STOP,
@@ -118,5 +151,6 @@ CONFIG_KEYS = [
 	KEY_BREAKPOINT_ENABLED,
 	KEY_CURRENT_LINE,
 	KEY_PYTHON_PATH,
-	KEY_DEBUG
+	KEY_DEBUG,
+	KEY_SESSION_FILTER
 ]
\ No newline at end of file
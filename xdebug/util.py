@@ -1,6 +1,7 @@
 import sublime
 
 import json
+import math
 import os
 import re
 import sys
@@ -25,6 +26,230 @@ from .config import get_value
 from .log import debug, info
 
 
+# Pattern for checking if path is a windows path
+DRIVE_PATTERN = re.compile(r'^[a-zA-Z]:[\\/]')
+# Pattern for splitting path into components, separated by either forward or backward slash
+PATH_SEPARATOR_PATTERN = re.compile(r'[\\/]')
+
+
+class PathMapping(object):
+    """
+    Map paths between server and local filesystem by longest matching path prefix.
+    Mappings are stored per path component in a trie for both directions,
+    resolved uris are kept in a limited cache.
+    """
+    CACHE_SIZE = 1024
+
+    def __init__(self, path_mapping):
+        self.server_paths = {}
+        self.local_paths = {}
+        self.cache = H.new_dictionary()
+        if isinstance(path_mapping, dict):
+            for server_path, local_path in path_mapping.items():
+                server_path = os.path.normpath(server_path)
+                local_path = os.path.normpath(local_path)
+                self.add(self.server_paths, server_path, local_path)
+                self.add(self.local_paths, local_path, server_path)
+
+    def add(self, trie, path, mapped_path):
+        """
+        Store mapped path in trie under components of path.
+
+        Keyword arguments:
+        trie -- Trie to store mapping in.
+        path -- Path which should be replaced.
+        mapped_path -- Path to replace it with.
+        """
+        node = trie
+        for component in self.split(path):
+            node = node.setdefault(component, {})
+        # Components are strings, None holds the mapped path of node
+        node[None] = mapped_path
+
+    def get(self, key):
+        """
+        Get resolved uri from cache, returns None when not available.
+
+        Keyword arguments:
+        key -- Tuple with uri and direction of mapping.
+        """
+        if key not in self.cache:
+            return None
+        # Move entry to end, marking it as most recently used
+        value = self.cache.pop(key)
+        self.cache[key] = value
+        return value
+
+    def map(self, path, server=False):
+        """
+        Replace longest matching prefix of path with mapped path.
+
+        Keyword arguments:
+        path -- Normalized path to map.
+        server -- Map local path to server path.
+        """
+        node = self.local_paths if server else self.server_paths
+        mapped_path = None
+        offset = 0
+        length = -1
+        for component in self.split(path):
+            if component not in node:
+                break
+            node = node[component]
+            # Keep position after component including its separator
+            length += len(component) + 1
+            if None in node:
+                mapped_path = node[None]
+                offset = length
+        if mapped_path is None:
+            return path
+        remainder = path[offset:]
+        if not remainder:
+            return mapped_path
+        return mapped_path.rstrip('\\/') + remainder
+
+    def set(self, key, value):
+        """
+        Store resolved uri in cache, removing least recently used entry when full.
+
+        Keyword arguments:
+        key -- Tuple with uri and direction of mapping.
+        value -- Resolved uri.
+        """
+        self.cache[key] = value
+        if len(self.cache) > self.CACHE_SIZE:
+            del self.cache[next(iter(self.cache))]
+
+    def split(self, path):
+        """
+        Split path into components, ignoring trailing separator.
+
+        Keyword arguments:
+        path -- Normalized path to split.
+        """
+        components = PATH_SEPARATOR_PATTERN.split(path)
+        if len(components) > 1 and not components[-1]:
+            components.pop()
+        return components
+
+
+def cache_properties(index, depth=0):
+    """
+    Store properties in cache of current break.
+
+    Keyword arguments:
+    index -- Dictionary with properties by fullname, as built by get_response_properties().
+    depth -- Stack depth of properties.
+    """
+    for fullname, variable in index.items():
+        S.PROPERTY_CACHE[(depth, variable.context_id, fullname)] = variable
+
+
+def cache_evaluation(expression, properties, depth=0):
+    """
+    Store properties of evaluated expression in cache of current break.
+
+    Keyword arguments:
+    expression -- Expression which has been evaluated.
+    properties -- Dictionary with properties from response of evaluation.
+    depth -- Stack depth in which expression has been evaluated.
+    """
+    S.PROPERTY_CACHE[(depth, None, expression)] = properties
+
+
+def clear_property_cache():
+    """
+    Clear cache of current break, including context of stack frames, when execution continues.
+    """
+    if S.PROPERTY_CACHE_STATS['hits'] or S.PROPERTY_CACHE_STATS['misses']:
+        debug('Property cache: %d hits, %d misses', S.PROPERTY_CACHE_STATS['hits'], S.PROPERTY_CACHE_STATS['misses'])
+    S.PROPERTY_CACHE.clear()
+    S.CONTEXT_FRAMES.clear()
+    S.CONTEXT_DEPTH = 0
+    S.STACK_LEVELS = 0
+    S.PROPERTY_CACHE_STATS['hits'] = 0
+    S.PROPERTY_CACHE_STATS['misses'] = 0
+
+
+def get_cached_evaluation(expression, depth=0):
+    """
+    Get properties of evaluated expression from cache of current break.
+
+    Keyword arguments:
+    expression -- Expression which has been evaluated.
+    depth -- Stack depth in which expression has been evaluated.
+    """
+    return get_cached_value((depth, None, expression))
+
+
+def get_cached_property(fullname, context_id=None, depth=0):
+    """
+    Get property from cache of current break.
+
+    Keyword arguments:
+    fullname -- Full name of property.
+    context_id -- Context of property, search all contexts when undefined.
+    depth -- Stack depth of property.
+    """
+    if context_id is not None:
+        return get_cached_value((depth, context_id, fullname))
+    # Locals, superglobals and user defined constants
+    for context_id in (1, 2):
+        if (depth, context_id, fullname) in S.PROPERTY_CACHE:
+            return get_cached_value((depth, context_id, fullname))
+    return get_cached_value((depth, 0, fullname))
+
+
+def get_cached_value(key):
+    """
+    Get value from cache of current break and count hits/misses.
+
+    Keyword arguments:
+    key -- Tuple with stack depth, context id and fullname.
+    """
+    if key in S.PROPERTY_CACHE:
+        S.PROPERTY_CACHE_STATS['hits'] += 1
+        return S.PROPERTY_CACHE[key]
+    S.PROPERTY_CACHE_STATS['misses'] += 1
+    return None
+
+
+def get_command_statistics():
+    """
+    Summarize statistics of recent commands per command type, with percentiles
+    of round trip, parse and render times in milliseconds and size of responses in bytes.
+    """
+    values = H.new_dictionary()
+    for statistics in list(S.COMMAND_STATISTICS):
+        values.setdefault(statistics['command'], []).append(statistics)
+
+    summary = H.new_dictionary()
+    for command, entries in sorted(values.items()):
+        summary[command] = {'count': len(entries)}
+        for key in ('rtt', 'parse', 'render'):
+            summary[command][key] = get_percentiles([entry[key] * 1000 for entry in entries if entry[key] is not None])
+        summary[command]['bytes_sent'] = get_percentiles([entry['bytes_sent'] for entry in entries])
+        summary[command]['bytes_received'] = get_percentiles([entry['bytes_received'] for entry in entries if entry['bytes_received'] is not None])
+    return summary
+
+
+def get_percentiles(values):
+    """
+    Get 50th, 90th and 99th percentile and maximum of values, by nearest rank.
+
+    Keyword arguments:
+    values -- List of numbers.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    percentiles = {}
+    for percentile in (50, 90, 99):
+        percentiles['p%d' % percentile] = values[max(0, int(math.ceil(percentile / 100.0 * len(values))) - 1)]
+    percentiles['max'] = values[-1]
+    return percentiles
+
+
 def get_real_path(uri, server=False):
     """
     Get real path
@@ -32,12 +257,21 @@ def get_real_path(uri, server=False):
     Keyword arguments:
     uri -- Uri of file that needs to be mapped and located
     server -- Map local path to server path
-
-    TODO: Fix mapping for root (/) and drive letters (P:/)
     """
     if uri is None:
         return uri
 
+    # Build path mapping once, configuration resets it when changed
+    path_mapping = get_value(S.KEY_PATH_MAPPING)
+    if S.PATH_MAPPING is None:
+        S.PATH_MAPPING = PathMapping(path_mapping)
+
+    # Use previously resolved uri
+    key = (uri, server)
+    real_path = S.PATH_MAPPING.get(key)
+    if real_path is not None:
+        return real_path
+
     # URLdecode uri
     uri = H.url_decode(uri)
 
@@ -52,41 +286,25 @@ def get_real_path(uri, server=False):
     # Normalize path for comparison and remove duplicate/trailing slashes
     uri = os.path.normpath(filename)
 
-    # Pattern for checking if uri is a windows path
-    drive_pattern = re.compile(r'^[a-zA-Z]:[\\/]')
-
     # Append leading slash if filesystem is not Windows
-    if not drive_pattern.match(uri) and not os.path.isabs(uri):
+    if not DRIVE_PATTERN.match(uri) and not os.path.isabs(uri):
         uri = os.path.normpath('/' + uri)
 
-    path_mapping = get_value(S.KEY_PATH_MAPPING)
     if isinstance(path_mapping, dict):
-        # Go through path mappings
-        for server_path, local_path in path_mapping.items():
-            server_path = os.path.normpath(server_path)
-            local_path = os.path.normpath(local_path)
-            # Replace path if mapping available
-            if server:
-                # Map local path to server path
-                if local_path in uri:
-                    uri = uri.replace(local_path, server_path)
-                    break
-            else:
-                # Map server path to local path
-                if server_path in uri:
-                    uri = uri.replace(server_path, local_path)
-                    break
+        # Replace longest matching path mapping
+        uri = S.PATH_MAPPING.map(uri, server)
     else:
         sublime.set_timeout(lambda: sublime.status_message("Xdebug: No path mapping defined, returning given path."), 100)
 
     # Replace slashes
-    if not drive_pattern.match(uri):
+    if not DRIVE_PATTERN.match(uri):
         uri = uri.replace("\\", "/")
 
     # Append scheme
     if server:
-        return H.url_encode("file://" + uri)
+        uri = H.url_encode("file://" + uri)
 
+    S.PATH_MAPPING.set(key, uri)
     return uri
 
 
@@ -194,7 +412,7 @@ def launch_browser():
         operator = '&'
 
     # Start debug session
-    if S.SESSION and (S.SESSION.listening or not S.SESSION.connected):
+    if S.SESSION and not S.SESSION.connected:
         webbrowser.open(url + operator + 'XDEBUG_SESSION_START=' + ide_key)
     # Stop debug session
     else:
@@ -279,7 +497,21 @@ def save_breakpoint_data():
         data.write(H.data_write(json.dumps(S.BREAKPOINT)))
 
 
+def save_statistics_data():
+    """
+    Export statistics of recent commands, and their summary, as JSON.
+    Returns path of file to which statistics have been exported.
+    """
+    data_path = os.path.join(sublime.packages_path(), 'User', S.FILE_STATISTICS_DATA)
+    statistics = {'summary': get_command_statistics(), 'commands': list(S.COMMAND_STATISTICS)}
+    with open(data_path, 'wb') as data:
+        data.write(H.data_write(json.dumps(statistics, indent=4)))
+    return data_path
+
+
 def save_watch_data():
     data_path = os.path.join(sublime.packages_path(), 'User', S.FILE_WATCH_DATA)
     with open(data_path, 'wb') as data:
-        data.write(H.data_write(json.dumps(S.WATCH)))
\ No newline at end of file
+        # Values of expressions refer to their parent and only apply to current break
+        watch = [dict((key, None if key == 'value' else value) for key, value in item.items()) for item in S.WATCH]
+        data.write(H.data_write(json.dumps(watch)))
\ No newline at end of file
@@ -1,5 +1,7 @@
 import sublime
 
+import difflib
+import itertools
 import operator
 import os
 import re
@@ -26,7 +28,7 @@ except:
 from .config import get_value, get_window_value, set_window_value
 
 # Util module
-from .util import get_real_path, get_region_icon, save_watch_data
+from .util import get_cached_property, get_real_path, get_region_icon, save_watch_data
 
 
 DATA_BREAKPOINT = 'breakpoint'
@@ -39,6 +41,92 @@ TITLE_WINDOW_CONTEXT = "Xdebug Context"
 TITLE_WINDOW_STACK = "Xdebug Stack"
 TITLE_WINDOW_WATCH = "Xdebug Watch"
 
+OUTPUT_PROPERTY_CHILDREN = H.unicode_string('{type}[{numchildren}]\n')
+OUTPUT_PROPERTY_LIMITED = H.unicode_string('\t...\n')
+OUTPUT_PROPERTY_NAME = H.unicode_string('{name} = ')
+OUTPUT_PROPERTY_UNKNOWN = H.unicode_string('<{type}>\n')
+OUTPUT_PROPERTY_VALUE = H.unicode_string('({type}) {value}\n')
+OUTPUT_VALUE_LIMITED = H.unicode_string('...')
+
+
+class PropertyNode(object):
+    """
+    Property of context variable or evaluated expression.
+    Uses slots instead of a dictionary per instance, as context data can hold a large number of properties.
+    Base64 encoded values are kept as received and only decoded when value is accessed.
+    """
+    __slots__ = ('name', 'type', '_value', 'encoded', 'size', 'numchildren', 'children', 'context_id', 'parent')
+
+    def __init__(self, name=None, type=None, value=None, numchildren=None, children=None, context_id=None, parent=None, encoded=None, size=None):
+        self.name = name
+        # Share type strings, as most properties have one of only a few types
+        self.type = H.intern_string(type)
+        self.value = value
+        self.encoded = encoded
+        self.size = size
+        self.numchildren = numchildren
+        self.children = children
+        self.context_id = context_id
+        self.parent = parent
+
+    @property
+    def value(self):
+        # Decode value on first access, keep decoded value for next access
+        if self.encoded is not None:
+            try:
+                self._value = H.base64_decode(self.encoded)
+            except:
+                self._value = self.encoded
+            self.encoded = None
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self.encoded = None
+
+    def has_value(self):
+        """
+        Check if property has a value, without decoding it.
+        """
+        return self._value is not None or self.encoded is not None
+
+    def is_truncated(self):
+        """
+        Check if value has been truncated by debugger engine, as its size exceeds maximum amount of data.
+        """
+        if not (H.is_number(self.size) or H.is_digit(self.size)):
+            return False
+        # Size of decoded data, without decoding value
+        if self.encoded is not None:
+            length = len(self.encoded) * 3 // 4 - self.encoded[-2:].count('=')
+        elif self._value is not None:
+            length = len(H.data_write(self._value))
+        else:
+            return False
+        return int(self.size) > length
+
+    def get_value(self, length=None):
+        """
+        Return value of property, or its first characters as unicode string when length is defined.
+        Only decodes the part which is returned when value has not been decoded yet.
+
+        Keyword arguments:
+        length -- Maximum amount of characters to return.
+        """
+        if length is None:
+            return self.value
+        if self.encoded is not None:
+            try:
+                return H.base64_decode_prefix(self.encoded, length)
+            except:
+                pass
+        # Decode before truncating, to prevent splitting multibyte characters
+        value = self.value
+        if value:
+            return H.unicode_string(value)[:length]
+        return value
+
 
 def close_debug_windows():
     """
@@ -85,64 +173,92 @@ def generate_breakpoint_output():
     return values
 
 
-def generate_context_output(context, indent=0):
+def generate_context_output(context, indent=0, max_length=None, max_children=None):
     """
     Generate readable context from dictionary with context data.
 
     Keyword arguments:
     context -- Dictionary with context data.
     indent -- Indent level.
+    max_length -- Maximum amount of characters to show per value.
+    max_children -- Maximum amount of children to show per property.
+    """
+    # Join output at once, instead of concatenating output for each property
+    return H.unicode_string('').join(iter_context_output(context, indent, max_length, max_children))
+
+
+def iter_context_output(context, indent=0, max_length=None, max_children=None):
+    """
+    Generate readable context from dictionary with context data, yielding output in parts.
+
+    Keyword arguments:
+    context -- Dictionary with context data.
+    indent -- Indent level.
+    max_length -- Maximum amount of characters to show per value.
+    max_children -- Maximum amount of children to show per property.
     """
-    # Generate output text for values
-    values = H.unicode_string('')
     if not isinstance(context, dict):
-        return values
+        return
+    # Set indentation
+    indentation = H.unicode_string('\t' * indent)
     for variable in context.values():
         has_children = False
-        property_text = ''
-        # Set indentation
-        for i in range(indent): property_text += '\t'
         # Property with value
-        if variable['value'] is not None:
-            if variable['name']:
-                property_text += '{name} = '
-            property_text += '({type}) {value}\n'
+        if variable.has_value():
+            property_text = OUTPUT_PROPERTY_VALUE
         # Property with children
-        elif isinstance(variable['children'], dict) and variable['numchildren'] is not None:
+        elif isinstance(variable.children, dict) and variable.numchildren is not None:
             has_children = True
-            if variable['name']:
-                property_text += '{name} = '
-            property_text += '{type}[{numchildren}]\n'
+            property_text = OUTPUT_PROPERTY_CHILDREN
         # Unknown property
         else:
-            if variable['name']:
-                property_text += '{name} = '
-            property_text += '<{type}>\n'
+            property_text = OUTPUT_PROPERTY_UNKNOWN
+
+        # Only decode visible part of value, use ellipsis to indicate that value has been truncated
+        value = variable.get_value(max_length + 1 if max_length else None)
+        if value:
+            # Decode (byte) string before truncating or appending ellipsis
+            value = H.unicode_string(value)
+            if max_length and len(value) > max_length:
+                value = value[:max_length] + OUTPUT_VALUE_LIMITED
+            elif variable.is_truncated():
+                value += OUTPUT_VALUE_LIMITED
 
         # Remove newlines in value to prevent incorrect indentation
-        value = ''
-        if variable['value'] and len(variable['value']) > 0:
-            value = variable['value'].replace("\r\n", "\n").replace("\n", " ")
+        if value:
+            value = value.replace("\r\n", "\n").replace("\n", " ")
+        else:
+            value = ''
 
-        # Format string and append to output
-        values += H.unicode_string(property_text \
-                        .format(value=value, type=variable['type'], name=variable['name'], numchildren=variable['numchildren']))
+        # Format string and append to output, decode (byte) strings as unicode templates are used
+        yield indentation
+        if variable.name:
+            yield OUTPUT_PROPERTY_NAME.format(name=H.unicode_string(variable.name))
+        property_type = H.unicode_string(variable.type) if variable.type else variable.type
+        yield property_text.format(value=H.unicode_string(value), type=property_type, numchildren=variable.numchildren)
 
         # Append property children to output
         if has_children:
+            children = variable.children
+            # Only show maximum amount of children
+            if max_children and len(children) > max_children:
+                children = H.new_dictionary()
+                for key in itertools.islice(variable.children, max_children):
+                    children[key] = variable.children[key]
             # Get children for property (no need to convert, already unicode)
-            values += generate_context_output(variable['children'], indent+1)
+            for output in iter_context_output(children, indent+1, max_length, max_children):
+                yield output
             # Use ellipsis to indicate that results have been truncated
             limited = False
-            if isinstance(variable['numchildren'], int) or H.is_digit(variable['numchildren']):
-                if int(variable['numchildren']) != len(variable['children']):
+            if len(children) != len(variable.children):
+                limited = True
+            elif isinstance(variable.numchildren, int) or H.is_digit(variable.numchildren):
+                if int(variable.numchildren) != len(variable.children):
                     limited = True
-            elif len(variable['children']) > 0 and not variable['numchildren']:
+            elif len(variable.children) > 0 and not variable.numchildren:
                 limited = True
             if limited:
-                for i in range(indent+1): values += H.unicode_string('\t')
-                values += H.unicode_string('...\n')
-    return values
+                yield indentation + OUTPUT_PROPERTY_LIMITED
 
 
 def generate_stack_output(response):
@@ -179,6 +295,33 @@ def generate_stack_output(response):
     return values
 
 
+def generate_statistics_output(summary):
+    """
+    Generate output with statistics per command type.
+
+    Keyword arguments:
+    summary -- Dictionary with statistics per command, as summarized by get_command_statistics().
+    """
+    values = H.unicode_string('')
+    if not summary:
+        return H.unicode_string('No commands have been sent to debugger engine.\n')
+    values += H.unicode_string('{command:<20} {count:>6}  {rtt:<24}  {parse:<24}  {render:<24}  {received}\n' \
+                              .format(command='command', count='count', rtt='rtt ms (p50/p90/p99)', parse='parse ms (p50/p90/p99)', render='render ms (p50/p90/p99)', received='received bytes (p50/max)'))
+    for command, statistics in summary.items():
+        timings = {}
+        for key in ('rtt', 'parse', 'render'):
+            if statistics[key]:
+                timings[key] = '%.1f/%.1f/%.1f' % (statistics[key]['p50'], statistics[key]['p90'], statistics[key]['p99'])
+            else:
+                timings[key] = '-'
+        received = '-'
+        if statistics['bytes_received']:
+            received = '%d/%d' % (statistics['bytes_received']['p50'], statistics['bytes_received']['max'])
+        values += H.unicode_string('{command:<20} {count:>6}  {rtt:<24}  {parse:<24}  {render:<24}  {received}\n' \
+                                  .format(command=command, count=statistics['count'], received=received, **timings))
+    return values
+
+
 def generate_watch_output():
     """
     Generate output with all watch expressions.
@@ -200,7 +343,8 @@ def generate_watch_output():
                 watch_entry += ' "%s"' % watch_data['expression']
             # Evaluated value
             if watch_data['value'] is not None:
-                watch_entry += ' = ' + generate_context_output(watch_data['value'])
+                max_length, max_children = get_display_limit(DATA_WATCH)
+                watch_entry += ' = ' + generate_context_output(watch_data['value'], max_length=max_length, max_children=max_children)
             else:
                 watch_entry += "\n"
         values += H.unicode_string(watch_entry)
@@ -219,12 +363,28 @@ def get_context_variable(context, variable_name):
         if variable_name in context:
             return context[variable_name]
         for variable in context.values():
-            if isinstance(variable['children'], dict):
-                children = get_context_variable(variable['children'], variable_name)
+            if isinstance(variable.children, dict):
+                children = get_context_variable(variable.children, variable_name)
                 if children:
                     return children
 
 
+def has_unloaded_children(variable):
+    """
+    Determine if not all children of variable have been retrieved from debugger engine.
+
+    Keyword arguments:
+    variable -- Variable from context data.
+    """
+    if not isinstance(variable, PropertyNode) or variable.name is None:
+        return False
+    numchildren = variable.numchildren
+    if not (isinstance(numchildren, int) or H.is_digit(numchildren)):
+        return False
+    children = variable.children if isinstance(variable.children, dict) else {}
+    return int(numchildren) > len(children)
+
+
 def get_debug_index(name=None):
     """
     Retrieve configured group/index position of of debug view(s) within active window.
@@ -289,13 +449,38 @@ def get_debug_index(name=None):
     return sorted_list
 
 
-def get_response_properties(response, default_key=None):
+def get_display_limit(name):
+    """
+    Retrieve configured maximum amount of characters per value and children per property for debug view.
+    Returns tuple with maximum amount of characters and children, which is None when not limited.
+
+    Keyword arguments:
+    name -- Name of debug view.
+    """
+    limits = get_value(S.KEY_DISPLAY_LIMIT)
+    if not isinstance(limits, dict) or not isinstance(limits.get(name), dict):
+        return None, None
+    values = []
+    for key in ('length', 'children'):
+        value = limits[name].get(key)
+        # Zero or invalid value disables limit
+        if (H.is_number(value) or H.is_digit(value)) and int(value) > 0:
+            values.append(int(value))
+        else:
+            values.append(None)
+    return tuple(values)
+
+
+def get_response_properties(response, default_key=None, context_id=None, index=None, parent=None):
     """
     Return a dictionary with available properties from response.
 
     Keyword arguments:
-    response -- Response from debugger engine.
+    response -- Response from debugger engine, or iterable which yields its child elements.
     default_key -- Index key to use when property has no name.
+    context_id -- Context of properties, required for retrieving children of property afterwards.
+    index -- Dictionary in which each property, including children, is stored by fullname.
+    parent -- Property which holds properties of response as children.
     """
     properties = H.new_dictionary()
     # Walk through elements in response
@@ -310,17 +495,17 @@ def get_response_properties(response, default_key=None):
             property_numchildren = child.get(dbgp.PROPERTY_NUMCHILDREN)
             property_classname = child.get(dbgp.PROPERTY_CLASSNAME)
             property_encoding = child.get(dbgp.PROPERTY_ENCODING)
+            property_size = child.get(dbgp.PROPERTY_SIZE)
             property_value = None
+            property_encoded = None
 
             # Set property value
             if child.text:
-                property_value = child.text
-                # Try to decode property value when encoded with base64
+                # Keep property value encoded with base64 until it is used
                 if property_encoding is not None and property_encoding == 'base64':
-                    try:
-                        property_value = H.base64_decode(child.text)
-                    except:
-                        pass
+                    property_encoded = child.text
+                else:
+                    property_value = child.text
 
             if property_name is not None and len(property_name) > 0:
                 property_key = property_name
@@ -333,22 +518,28 @@ def get_response_properties(response, default_key=None):
                     continue
 
                 # Filter password values
-                if get_value(S.KEY_HIDE_PASSWORD, True) and property_name.lower().find('password') != -1 and property_value is not None:
+                if get_value(S.KEY_HIDE_PASSWORD, True) and property_name.lower().find('password') != -1 and child.text:
                     property_value = '******'
+                    property_encoded = None
+                    property_size = None
             else:
                 property_key = default_key
 
             # Store property
             if property_key:
-                properties[property_key] = { 'name': property_name, 'type': property_type, 'value': property_value, 'numchildren': property_numchildren, 'children' : None }
+                properties[property_key] = PropertyNode(property_name, property_type, property_value, property_numchildren, None, context_id, parent, property_encoded, property_size)
+
+                # Add property to flat index for direct lookup by fullname
+                if index is not None and property_name:
+                    index[property_name] = properties[property_key]
 
                 # Get values for children
                 if property_children:
-                    properties[property_key]['children'] = get_response_properties(child, default_key)
+                    properties[property_key].children = get_response_properties(child, default_key, context_id, index, properties[property_key])
 
                 # Set classname, if available, as type for object
                 if property_classname and property_type == 'object':
-                    properties[property_key]['type'] = property_classname
+                    properties[property_key].type = H.intern_string(property_classname)
         # Handle error elements
         elif child.tag == dbgp.ELEMENT_ERROR or child.tag == dbgp.ELEMENT_PATH_ERROR:
             message = 'error'
@@ -357,7 +548,7 @@ def get_response_properties(response, default_key=None):
                     message = step_child.text
                     break
             if default_key:
-                properties[default_key] = { 'name': None, 'type': message, 'value': None, 'numchildren': None, 'children': None }
+                properties[default_key] = PropertyNode(None, message, None, None, None, context_id, parent)
     return properties
 
 
@@ -378,6 +569,21 @@ def has_debug_view(name=None):
     return False
 
 
+def has_visible_debug_view(name):
+    """
+    Determine if debug view is visible in active window, being the active view in its group.
+
+    Keyword arguments:
+    name -- Name of debug view to search for in active window.
+    """
+    window = sublime.active_window()
+    for group in range(window.num_groups()):
+        view = window.active_view_in_group(group)
+        if view is not None and view.name() == name:
+            return True
+    return False
+
+
 def is_debug_view(view):
     """
     Check if view name matches debug name/title.
@@ -535,9 +741,12 @@ def show_content(data, content=None):
     view.settings().set('word_wrap', False)
     view.settings().set('syntax', 'Packages/' + package + '/Xdebug.tmLanguage')
 
-    # Set content for view and fold all indendation blocks
-    view.run_command('xdebug_view_update', {'data': content, 'readonly': True})
-    if data == DATA_CONTEXT or data == DATA_WATCH:
+    # Set content for view by only updating changed lines
+    fold = data == DATA_CONTEXT or data == DATA_WATCH
+    has_content = bool(S.VIEW_HASHES.get(view.id()))
+    view.run_command('xdebug_view_update', {'data': content, 'readonly': True, 'diff': True, 'fold': fold})
+    # Fold all indendation blocks when content is shown for first time
+    if fold and not has_content:
         view.run_command('fold_all')
 
     # Restore focus to previous active view/group
@@ -547,6 +756,80 @@ def show_content(data, content=None):
         window.focus_group(0)
 
 
+def update_view_content(view, edit, content, fold=False):
+    """
+    Update content of view by only replacing lines which have been changed,
+    compared by hashes of lines from previous content.
+    Changed lines are highlighted and fold state of unchanged lines is kept.
+
+    Keyword arguments:
+    view -- View reference which content to update.
+    edit -- sublime.Edit object of view.
+    content -- New content for view.
+    fold -- Fold indentation blocks of inserted lines, keeping fold state of other lines.
+    """
+    lines = content.splitlines(True)
+    hashes = [hash(line) for line in lines]
+    previous_hashes = S.VIEW_HASHES.get(view.id())
+    S.VIEW_HASHES[view.id()] = hashes
+
+    # Replace all content when there is no previous content to compare with
+    if not previous_hashes:
+        view.erase_regions(S.REGION_KEY_CHANGED)
+        view.replace(edit, sublime.Region(0, view.size()), content)
+        return
+
+    # Rows which start a folded indentation block
+    folded_rows = set()
+    if fold:
+        try:
+            for region in view.folded_regions():
+                folded_rows.add(view.rowcol(region.begin())[0])
+        except AttributeError:
+            # Sublime Text 2 has no folded_regions()
+            pass
+
+    matcher = difflib.SequenceMatcher(None, previous_hashes, hashes)
+    opcodes = matcher.get_opcodes()
+
+    # Replace changed lines, starting at the end to keep positions of previous lines valid
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        if tag == 'equal':
+            continue
+        begin = view.text_point(i1, 0) if i1 < len(previous_hashes) else view.size()
+        end = view.text_point(i2, 0) if i2 < len(previous_hashes) else view.size()
+        view.replace(edit, sublime.Region(begin, end), ''.join(lines[j1:j2]))
+
+    # Determine rows of changed lines and rows which should be folded
+    changed_rows = []
+    fold_rows = set()
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag != 'equal':
+            changed_rows.extend(range(j1, j2))
+        for j in range(j1, j2):
+            # Keep fold state of line which is unchanged or replaced, fold newly inserted lines
+            i = i1 + j - j1
+            if tag == 'insert' or i >= i2 or i in folded_rows:
+                fold_rows.add(j)
+
+    # Highlight changed lines
+    changed_regions = [view.line(view.text_point(row, 0)) for row in changed_rows]
+    view.add_regions(S.REGION_KEY_CHANGED, changed_regions, S.REGION_SCOPE_CHANGED, '', sublime.DRAW_OUTLINED)
+
+    # Fold indentation blocks of inserted lines and blocks which were folded before
+    if fold:
+        fold_regions = []
+        for row in sorted(fold_rows):
+            indent = len(lines[row]) - len(lines[row].lstrip('\t'))
+            last_row = row
+            while last_row + 1 < len(lines) and len(lines[last_row + 1]) - len(lines[last_row + 1].lstrip('\t')) > indent:
+                last_row += 1
+            if last_row > row:
+                fold_regions.append(sublime.Region(view.line(view.text_point(row, 0)).end(), view.line(view.text_point(last_row, 0)).end()))
+        if fold_regions:
+            view.fold(fold_regions)
+
+
 def show_context_output(view):
     """
     Show selected variable in an output panel when clicked in context window.
@@ -568,7 +851,9 @@ def show_context_output(view):
                 if match:
                     # Get variable details from context data
                     variable_name = match.group(1)
-                    variable = get_context_variable(S.CONTEXT_DATA, variable_name)
+                    variable = get_cached_property(variable_name, depth=S.CONTEXT_DEPTH)
+                    if variable is None:
+                        variable = get_context_variable(S.CONTEXT_DATA, variable_name)
                     if variable:
                         # Convert details to text output
                         variables = H.new_dictionary()
@@ -580,6 +865,12 @@ def show_context_output(view):
                         panel.run_command("xdebug_view_update", {'data' : data} )
                         panel.run_command('set_setting', {"setting": 'word_wrap', "value": True})
                         window.run_command('show_panel', {"panel": 'output.xdebug'})
+                        # Retrieve (next page of) children which have not been loaded yet
+                        if has_unloaded_children(variable):
+                            window.run_command('xdebug_expand', {'name': variable_name})
+                        # Retrieve complete value when truncated by debugger engine
+                        if variable.is_truncated():
+                            window.run_command('xdebug_expand_value', {'name': variable_name})
         except:
             pass
 
@@ -863,7 +1154,7 @@ def toggle_stack(view):
         if point.size() > 3 and sublime.score_selector(view.scope_name(point.a), 'xdebug.output.stack.entry'):
             # Get fileuri and line number from selected line in view
             line = view.substr(view.line(point))
-            pattern = re.compile('^(\[\d+\])\s*(?P<fileuri>.*)(\..*)(\s*:.*?(?P<lineno>\d+))\s*(\((.*?):.*\)|$)')
+            pattern = re.compile('^(\[(?P<level>\d+)\])\s*(?P<fileuri>.*)(\..*)(\s*:.*?(?P<lineno>\d+))\s*(\((.*?):.*\)|$)')
             match = pattern.match(line)
             # Show file when it's a valid fileuri
             if match and match.group('fileuri'):
@@ -872,6 +1163,8 @@ def toggle_stack(view):
                 if match.group('lineno'):
                     lineno = match.group('lineno')
                 show_file(filename, lineno)
+                # Show variables of selected stack frame in context view
+                sublime.active_window().run_command('xdebug_frame', {'depth': int(match.group('level'))})
     except:
         pass
 